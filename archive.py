@@ -0,0 +1,116 @@
+import gzip
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TournamentArchive:
+    """Finished tournaments stored outside the working set, one file each
+
+    Every tournament is written with its teams as gzip-compressed JSON to
+    `<tournament id>.json.gz`, and a line naming its teams and roster photos
+    is appended to `index.jsonl`, so a team or a photo can be traced to its
+    archive without opening every file; the index is read once, on first
+    use, and kept in memory as it grows. Archives are written once and never
+    change. Writing the same tournament again replaces its file and adds a
+    duplicate index line, which readers tolerate, so an archive interrupted
+    before the tournament left the working set is simply redone.
+
+    All methods block; callers run them in a thread.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_file = os.path.join(directory, 'index.jsonl')
+        self._lock = threading.Lock()  # methods run in different threads
+        self._tournament_of = None  # team id -> tournament id, read from the index on first use
+        self._photos = None  # roster photos of archived teams
+
+    def _path(self, tournament_id):
+        """Return the archive file of a tournament"""
+        return os.path.join(self.directory, f"{tournament_id}.json.gz")
+
+    @staticmethod
+    def encode(tournament, teams):
+        """Serialize a tournament and its teams into (archive bytes, index line)
+
+        Runs on the event loop, so the records cannot change while they are
+        being written.
+        """
+        payload = json.dumps({'tournament': tournament, 'teams': teams}, separators=(',', ':'), ensure_ascii=False)
+        entry = {
+            'id': tournament['id'],
+            'teams': [team['id'] for team in teams],
+            'photos': sorted({photo for team in teams for photo in team.get('roster_photos', ()) if photo}),
+        }
+        return payload.encode(), json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+    def write(self, tournament_id, encoded):
+        """Store an encoded tournament durably and add it to the index"""
+        payload, entry = encoded
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(tournament_id)
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(gzip.compress(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        with self._lock:
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(entry)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._tournament_of is not None:
+                self._add_entry(json.loads(entry))
+
+    def read(self, tournament_id):
+        """Return {'tournament': ..., 'teams': [...]} of an archived tournament, or None"""
+        try:
+            with open(self._path(tournament_id), 'rb') as f:
+                return json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            logger.error(f"Damaged archive of {tournament_id}: {e}")
+            return None
+
+    def _entries(self):
+        """Yield the index entries; a line cut short by a crash is skipped"""
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    def _add_entry(self, entry):
+        """Add one index entry to the in-memory lookups"""
+        for team_id in entry['teams']:
+            self._tournament_of[team_id] = entry['id']
+        self._photos.update(entry['photos'])
+
+    def _load_index(self):
+        """Read the index into memory unless it already is; call with the lock held"""
+        if self._tournament_of is None:
+            self._tournament_of, self._photos = {}, set()
+            for entry in self._entries():
+                self._add_entry(entry)
+
+    def tournament_of(self, team_id):
+        """Return the id of the archived tournament a team played in, or None"""
+        with self._lock:
+            self._load_index()
+            return self._tournament_of.get(team_id)
+
+    def photo_names(self):
+        """Return the roster photos referenced by archived teams"""
+        with self._lock:
+            self._load_index()
+            return set(self._photos)
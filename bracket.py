@@ -0,0 +1,194 @@
+"""Single-elimination bracket engine
+
+A bracket for n teams is a complete binary tree over P = next power of two
+>= n leaves, stored heap-style in `slots` (length 2P, index 0 unused):
+
+- slots[P + k] is the team seeded into leaf k, or BYE for an empty leaf
+- slots[i] for 1 <= i < P is the winner of match i, whose teams are the
+  winners of its children 2i and 2i + 1; None while undecided
+- slots[1] is the tournament winner
+
+The match id is the node index, so looking up a match and advancing its
+winner into the parent slot are both O(1). A node with an empty (BYE)
+subtree on one side is a pass-through: its other child advances without a
+match. `pending[r]` counts the undecided real matches of round r, and a round
+is complete when it drops to zero. `version` increases with every result.
+"""
+
+BYE = ''
+
+
+class BracketError(ValueError):
+    """Raised when a result cannot be applied to a bracket"""
+
+
+def next_power_of_two(n):
+    """Return the smallest power of two >= n"""
+    return 1 << max(n - 1, 0).bit_length()
+
+
+def _bit_reverse(value, bits):
+    """Reverse the lowest `bits` bits of value"""
+    result = 0
+    for _ in range(bits):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+
+def create_bracket(team_ids):
+    """Build a bracket seeding team_ids in order, spreading byes evenly"""
+    if len(team_ids) < 2:
+        raise BracketError("Need at least 2 teams")
+    size = next_power_of_two(len(team_ids))
+    pair_count = size // 2
+    byes = size - len(team_ids)
+
+    # Bit-reversed pair order spreads byes across both halves of the tree,
+    # and since byes < pair_count no two byes ever share a pair
+    bits = pair_count.bit_length() - 1
+    bye_pairs = {_bit_reverse(k, bits) for k in range(byes)}
+    leaves = []
+    teams_iter = iter(team_ids)
+    for pair in range(pair_count):
+        leaves.append(next(teams_iter))
+        leaves.append(BYE if pair in bye_pairs else next(teams_iter))
+    return _build(leaves)
+
+
+def bracket_from_pairs(pairs):
+    """Build a bracket whose first round is the given (team1, team2) pairs
+
+    team2 may be None for a bye. Used to convert legacy list brackets.
+    """
+    pair_count = next_power_of_two(len(pairs))
+    leaves = []
+    for team1, team2 in pairs:
+        leaves.append(team1)
+        leaves.append(team2 or BYE)
+    leaves.extend([BYE] * (2 * pair_count - len(leaves)))
+    return _build(leaves)
+
+
+def _build(leaves):
+    """Create the tree over `leaves` and resolve every pass-through node"""
+    size = len(leaves)
+    rounds = size.bit_length() - 1
+    slots = [None] * size + list(leaves)
+    pending = [0] * (rounds + 1)
+    for node in range(size - 1, 0, -1):
+        left, right = slots[2 * node], slots[2 * node + 1]
+        if left == BYE or right == BYE:
+            # Pass-through: the other side advances without a match
+            other = right if left == BYE else left
+            if other is not None:
+                slots[node] = other
+        else:
+            pending[match_round_of(node, rounds)] += 1
+
+    bracket = {
+        'format': 'single_elimination',
+        'size': size,
+        'rounds': rounds,
+        'slots': slots,
+        'pending': pending,
+        'current_round': 1,
+        'status': 'active',
+        'winner': None,
+        'version': 0,
+    }
+    _advance_rounds(bracket)
+    return bracket
+
+
+def match_round_of(node, rounds):
+    """Return the round number (1 = first round) of a node"""
+    return rounds - (node.bit_length() - 1)
+
+
+def round_nodes(bracket, round_number):
+    """Return the node indices of one round"""
+    first = bracket['size'] >> round_number
+    return range(first, 2 * first)
+
+
+def get_match(bracket, match_id):
+    """Return a view of one real match, or None"""
+    slots = bracket['slots']
+    if not 1 <= match_id < bracket['size']:
+        return None
+    team1, team2 = slots[2 * match_id], slots[2 * match_id + 1]
+    if team1 == BYE or team2 == BYE:
+        return None
+    return {
+        'id': match_id,
+        'round': match_round_of(match_id, bracket['rounds']),
+        'team1': team1,
+        'team2': team2,
+        'winner': slots[match_id],
+    }
+
+
+def round_matches(bracket, round_number):
+    """Return the matches of one round; byes have team2 None"""
+    slots = bracket['slots']
+    matches = []
+    for node in round_nodes(bracket, round_number):
+        team1, team2 = slots[2 * node], slots[2 * node + 1]
+        if team1 == BYE and team2 == BYE:
+            continue
+        if team1 == BYE:
+            team1, team2 = team2, BYE
+        matches.append({
+            'id': node,
+            'round': round_number,
+            'team1': team1,
+            'team2': team2 if team2 != BYE else None,
+            'winner': slots[node],
+        })
+    return matches
+
+
+def report_winner(bracket, match_id, slot):
+    """Record the winner of a match by slot (1 or 2)
+
+    Returns the number of the round this result completed, or None.
+    """
+    match = get_match(bracket, match_id)
+    if match is None:
+        raise BracketError("Match not found")
+    if match['winner'] is not None:
+        raise BracketError("Winner already reported")
+    if match['team1'] is None or match['team2'] is None:
+        raise BracketError("Match is not ready yet")
+    if slot not in (1, 2):
+        raise BracketError("Invalid team")
+
+    slots = bracket['slots']
+    winner = match['team1'] if slot == 1 else match['team2']
+    slots[match_id] = winner
+    bracket['version'] = bracket.get('version', 0) + 1
+
+    # Carry the winner through pass-through nodes above this match
+    node = match_id // 2
+    while node >= 1 and slots[node] is None and BYE in (slots[2 * node], slots[2 * node + 1]):
+        slots[node] = winner
+        node //= 2
+
+    round_number = match['round']
+    bracket['pending'][round_number] -= 1
+    if bracket['pending'][round_number] > 0:
+        return None
+    _advance_rounds(bracket)
+    return round_number
+
+
+def _advance_rounds(bracket):
+    """Move current_round past completed rounds and detect the final result"""
+    pending = bracket['pending']
+    while bracket['current_round'] <= bracket['rounds'] and pending[bracket['current_round']] == 0:
+        bracket['current_round'] += 1
+    if bracket['slots'][1] is not None:
+        bracket['status'] = 'finished'
+        bracket['winner'] = bracket['slots'][1]
+        bracket['current_round'] = bracket['rounds']
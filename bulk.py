@@ -0,0 +1,99 @@
+"""CSV and JSON Lines files for bulk import and export
+
+Both formats carry the same fields: CSV files have a header row naming the
+columns, JSON Lines files have one object per line. Every row has a `type`:
+
+- `tournament`: name, max_teams and optionally format and description
+- `team`: name, leader_username and tournament, either the id of an
+  existing tournament or the name of a tournament row in the same file
+
+Exports use the same columns, so an exported tournament can be imported
+again. They add result rows that imports skip: `standing` rows (name, wins,
+losses) and `match` rows (round, team1, team2, winner).
+"""
+import csv
+import io
+import json
+
+COLUMNS = (
+    'type', 'tournament', 'name', 'leader_username', 'max_teams', 'format', 'description',
+    'round', 'team1', 'team2', 'winner', 'wins', 'losses',
+)
+RESULT_TYPES = ('standing', 'match')
+FORMATS = ('csv', 'jsonl')
+
+
+class BulkError(ValueError):
+    """Raised when an import file cannot be read at all"""
+
+
+def field(row, name):
+    """Return one field of a row as a stripped string; missing fields are empty"""
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def file_format(filename, text):
+    """Guess the format of an uploaded file from its name, then its content"""
+    if filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl' if text.lstrip().startswith('{') else 'csv'
+
+
+def read_rows(data, filename=''):
+    """Yield (line number, row) for every row of an uploaded file"""
+    try:
+        text = bytes(data).decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise BulkError("The file is not UTF-8 text")
+
+    if file_format(filename, text) == 'jsonl':
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise BulkError(f"Line {number}: not valid JSON")
+            if not isinstance(row, dict):
+                raise BulkError(f"Line {number}: expected a JSON object")
+            yield number, row
+        return
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or 'type' not in (name.strip() for name in reader.fieldnames):
+        raise BulkError("The CSV file needs a header row with a `type` column")
+    try:
+        for row in reader:
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key}
+    except csv.Error as e:
+        raise BulkError(f"Line {reader.line_num}: {e}")
+
+
+class ExportWriter:
+    """Write rows one at a time to a binary file as CSV or JSON Lines"""
+
+    def __init__(self, file, export_format='csv'):
+        self.export_format = export_format
+        self._text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        self._csv = None
+        if export_format == 'csv':
+            self._csv = csv.DictWriter(self._text, COLUMNS, restval='', extrasaction='ignore')
+            self._csv.writeheader()
+        self.rows = 0
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._text.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.rows += 1
+
+    def finish(self):
+        """Flush everything and return the underlying binary file, rewound"""
+        self._text.flush()
+        file = self._text.detach()
+        file.seek(0)
+        return file
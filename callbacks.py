@@ -0,0 +1,111 @@
+"""Compact, versioned encoding of inline keyboard callback data
+
+A payload is the format version, a one-character opcode and the arguments of
+the operation, separated by ':'. For example, reporting slot 2 as the winner
+of match 45 on page 0 of a round:
+
+    1w:19:2:0:tournament_20240101120000
+
+Integer arguments are written in base 36. An operation has at most one string
+argument (an id) and it always comes last, so ids may contain any character,
+including the separator. Telegram limits callback data to 64 bytes; encode()
+refuses anything longer instead of letting the API reject the keyboard.
+"""
+
+VERSION = '1'
+SEPARATOR = ':'
+MAX_CALLBACK_BYTES = 64
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+_operations = {}  # opcode -> (name, [(argument name, type)])
+_opcodes = {}     # name -> opcode
+
+
+class CallbackError(ValueError):
+    """Raised for callback data that cannot be encoded or decoded"""
+
+
+def to_base36(value):
+    """Write a non-negative integer in base 36"""
+    if value < 0:
+        raise CallbackError(f"Cannot encode negative number {value}")
+    digits = []
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append(_DIGITS[digit])
+        if not value:
+            return ''.join(reversed(digits))
+
+
+def register(opcode, name, **arguments):
+    """Define an operation; keyword order is the argument order on the wire"""
+    types = list(arguments.items())
+    if opcode in _operations or name in _opcodes:
+        raise ValueError(f"Callback operation {opcode!r}/{name!r} is already registered")
+    if str in [t for _, t in types[:-1]]:
+        raise ValueError(f"Only the last argument of {name!r} may be a string")
+    _operations[opcode] = (name, types)
+    _opcodes[name] = opcode
+
+
+def encode(name, **arguments):
+    """Return the callback data of an operation"""
+    opcode = _opcodes[name]
+    parts = [VERSION + opcode]
+    for argument, kind in _operations[opcode][1]:
+        value = arguments[argument]
+        parts.append(to_base36(value) if kind is int else str(value))
+    data = SEPARATOR.join(parts)
+    if len(data.encode()) > MAX_CALLBACK_BYTES:
+        raise CallbackError(f"Callback data for {name!r} is longer than {MAX_CALLBACK_BYTES} bytes")
+    return data
+
+
+def decode(data):
+    """Return (operation name, arguments) of callback data
+
+    Raises CallbackError for payloads of another version or unknown shape,
+    such as buttons on messages sent before an upgrade.
+    """
+    if not data or data[0] != VERSION or len(data) < 2:
+        raise CallbackError(f"Unsupported callback data {data!r}")
+    operation = _operations.get(data[1])
+    if operation is None:
+        raise CallbackError(f"Unknown callback operation {data!r}")
+    name, types = operation
+    if not types:
+        if len(data) != 2:
+            raise CallbackError(f"Unexpected arguments in {data!r}")
+        return name, {}
+
+    values = data[3:].split(SEPARATOR, len(types) - 1) if data[2:3] == SEPARATOR else []
+    if len(values) != len(types):
+        raise CallbackError(f"Wrong number of arguments in {data!r}")
+    arguments = {}
+    for (argument, kind), value in zip(types, values):
+        if kind is int:
+            try:
+                value = int(value, 36)
+            except ValueError:
+                raise CallbackError(f"Invalid number {value!r} in {data!r}") from None
+        arguments[argument] = value
+    return name, arguments
+
+
+register('n', 'noop')
+register('m', 'main_menu')
+register('t', 'tournaments', page=int)
+register('j', 'join_tournament', tournament_id=str)
+register('l', 'teams_list')
+register('v', 'tournament_teams', page=int, tournament_id=str)
+register('b', 'view_bracket', tournament_id=str)
+register('d', 'team_details', team_id=str)
+register('a', 'admin_panel')
+register('c', 'create_tournament_help')
+register('g', 'admin_manage_teams')
+register('e', 'admin_delete_team_menu', page=int, tournament_id=str)
+register('x', 'admin_delete_team', team_id=str)
+register('f', 'admin_delete_tournament_menu', page=int)
+register('y', 'admin_delete_tournament', tournament_id=str)
+register('w', 'report_winner', match_id=int, slot=int, page=int, tournament_id=str)
+register('r', 'round_page', round_number=int, page=int, tournament_id=str)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore:
+    """Per-user conversation state with expiry, a size cap and optional persistence
+
+    Every write gives an entry `ttl` more seconds to live and moves it to the
+    end of `entries`, so entries are ordered by last write, which is also
+    expiry order. Reads drop expired entries, a background task sweeps them
+    from the front, and once more than `max_entries` users have state the
+    least recently written ones are evicted.
+
+    `entries` maps str(user_id) to {'data': state, 'expires_at': unix time},
+    the same shape that is persisted, so it can be handed to WriteBehind as a
+    collection. `on_change(key)` is called for every entry written or removed.
+    """
+
+    def __init__(self, ttl, max_entries, sweep_interval=60.0, on_change=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.on_change = on_change
+        self.entries = OrderedDict()
+        self._task = None
+        self.expired = 0
+        self.evicted = 0
+
+    def load(self, records):
+        """Restore persisted entries, dropping those that expired meanwhile"""
+        now = time.time()
+        for key, record in sorted(records.items(), key=lambda item: item[1]['expires_at']):
+            if record['expires_at'] > now:
+                self.entries[key] = record
+            else:
+                self.expired += 1
+                self._changed(key)
+        self._evict()
+
+    def get(self, user_id):
+        """Return the state of a user, or None if there is none or it expired"""
+        key = str(user_id)
+        record = self.entries.get(key)
+        if record is None:
+            return None
+        if record['expires_at'] <= time.time():
+            del self.entries[key]
+            self.expired += 1
+            self._changed(key)
+            return None
+        return record['data']
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set(self, user_id, data):
+        """Replace the state of a user"""
+        key = str(user_id)
+        self.entries[key] = {'data': data, 'expires_at': time.time() + self.ttl}
+        self.entries.move_to_end(key)
+        self._changed(key)
+        self._evict()
+
+    def touch(self, user_id):
+        """Record in-place changes to a user's state and extend its lifetime"""
+        data = self.get(user_id)
+        if data is not None:
+            self.set(user_id, data)
+
+    def pop(self, user_id):
+        """Remove and return the state of a user"""
+        key = str(user_id)
+        record = self.entries.pop(key, None)
+        if record is None:
+            return None
+        self._changed(key)
+        return record['data']
+
+    def sweep(self):
+        """Remove expired entries; returns how many were removed"""
+        now = time.time()
+        removed = 0
+        while self.entries:
+            key, record = next(iter(self.entries.items()))
+            if record['expires_at'] > now:
+                break
+            del self.entries[key]
+            self._changed(key)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def _evict(self):
+        """Drop the least recently written entries beyond max_entries"""
+        while len(self.entries) > self.max_entries:
+            key, _ = self.entries.popitem(last=False)
+            self.evicted += 1
+            self._changed(key)
+
+    def _changed(self, key):
+        """Report a written or removed entry"""
+        if self.on_change is not None:
+            self.on_change(key)
+
+    async def _run(self):
+        """Sweep expired entries every sweep_interval seconds"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                logger.info(f"Expired {removed} abandoned conversations")
+
+    def start(self):
+        """Start the background sweeper on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background sweeper"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
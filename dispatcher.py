@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket that hands out send slots at `rate` per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take one token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        """Wait until a token is available"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def is_idle(self):
+        """Return True when the bucket has refilled completely"""
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+
+class Dispatcher:
+    """Send Bot API calls in the background within Telegram's rate limits
+
+    Calls are queued per chat and sent by a fixed pool of workers. A chat with
+    queued calls sits in a round-robin ready queue and is served by at most
+    one worker at a time, so calls to the same chat keep their order and a
+    long backlog for one chat does not hold up the others. Every call takes
+    a token from a global bucket and from a per-chat bucket (group chats get
+    the stricter group limit). A RetryAfter pauses the whole dispatcher for
+    the requested time before the call is retried.
+    """
+
+    def __init__(self, concurrency=8, global_rate=30.0, chat_rate=1.0, group_rate=20 / 60, max_retries=3):
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self._chat_queues = {}  # chat_id -> deque of queued calls
+        self._ready = asyncio.Queue()  # chat ids with queued calls and no worker
+        self._workers = []
+        self._queued = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_hits = 0
+
+    def submit(self, bot, method, chat_id, **kwargs):
+        """Queue `bot.<method>(chat_id=chat_id, **kwargs)` and return at once
+
+        The returned future resolves to the API result, or to the error if
+        the call failed for good.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        chat_queue = self._chat_queues.get(chat_id)
+        if chat_queue is None:
+            chat_queue = self._chat_queues[chat_id] = deque()
+            self._ready.put_nowait(chat_id)
+        chat_queue.append((bot, method, kwargs, future))
+        self._queued += 1
+        self._drained.clear()
+        return future
+
+    def start(self):
+        """Start the worker pool on the running loop"""
+        if self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout=10.0):
+        """Deliver what is queued, then stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queued} queued messages on shutdown")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def pending(self):
+        """Return the number of queued calls"""
+        return self._queued
+
+    def _chat_bucket(self, chat_id):
+        """Return the rate limiter of one chat"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 10000:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_idle()}
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, capacity=1.0)
+        return bucket
+
+    async def _worker(self):
+        """Send the next call of each ready chat in turn"""
+        while True:
+            chat_id = await self._ready.get()
+            chat_queue = self._chat_queues[chat_id]
+            bot, method, kwargs, future = chat_queue.popleft()
+            error = result = None
+            try:
+                result = await self._send(bot, method, chat_id, kwargs)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to {method} to {chat_id}: {e}")
+                error = e
+            else:
+                self.sent += 1
+            finally:
+                if chat_queue:
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._chat_queues[chat_id]
+                self._queued -= 1
+                if not self._queued:
+                    self._drained.set()
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _send(self, bot, method, chat_id, kwargs):
+        """Call the API within the rate limits, retrying on RetryAfter"""
+        for attempt in range(self.max_retries + 1):
+            await self._chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                return await getattr(bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_hits += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Flood control on {chat_id}, retrying in {e.retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
@@ -0,0 +1,32 @@
+import time
+
+from callbacks import to_base36
+
+EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+ID_WIDTH = 9  # base-36 digits, enough for 3000 years of milliseconds
+
+
+class IdAllocator:
+    """Hand out record ids that are unique, monotonic and sort by creation time
+
+    An id is a short prefix naming the record type followed by a fixed-width
+    base-36 number: the milliseconds since EPOCH_MS, pushed past the last
+    number handed out when two ids are allocated in the same millisecond or
+    the clock goes backwards. Fixed width makes string order match numeric
+    order.
+
+    `last` is the only state. on_change(last) is called after every
+    allocation so the caller can persist it together with the record that
+    uses the id; restoring it on startup keeps ids unique across restarts.
+    """
+
+    def __init__(self, last=0, on_change=None):
+        self.last = last
+        self.on_change = on_change
+
+    def allocate(self, prefix):
+        """Return a new id starting with prefix"""
+        self.last = max(self.last + 1, int(time.time() * 1000) - EPOCH_MS)
+        if self.on_change is not None:
+            self.on_change(self.last)
+        return prefix + to_base36(self.last).rjust(ID_WIDTH, '0')
@@ -0,0 +1,212 @@
+"""Pillow rendering of roster images and an on-disk render cache
+
+The render functions run in worker processes, so they only take and return
+plain data (paths, strings, bytes).
+"""
+import io
+import logging
+import os
+import tempfile
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+SHEET_TILE_SIZE = 400
+SHEET_PADDING = 12
+SHEET_HEADER_HEIGHT = 56
+SHEET_BACKGROUND = (24, 26, 33)
+SHEET_TEXT_COLOR = (255, 255, 255)
+
+
+def load_font(size):
+    """Return a TrueType font if one is installed, else Pillow's default"""
+    for name in ('DejaVuSans-Bold.ttf', 'Arial.ttf'):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def draw_title(draw, position, text, font, fill=SHEET_TEXT_COLOR):
+    """Draw text vertically centered on position"""
+    x, y = position
+    if isinstance(font, ImageFont.FreeTypeFont):
+        draw.text((x, y), text, fill=fill, font=font, anchor='lm')
+    else:
+        # Bitmap fonts do not support anchors
+        draw.text((x, y - 6), text, fill=fill, font=font)
+
+
+def render_contact_sheet(photo_paths, title):
+    """Composite roster photos side by side under a title; returns JPEG bytes"""
+    tiles = []
+    for path in photo_paths:
+        with Image.open(path) as photo:
+            photo = photo.convert('RGB')
+            photo.thumbnail((SHEET_TILE_SIZE, SHEET_TILE_SIZE))
+            tiles.append(photo)
+
+    width = sum(tile.width for tile in tiles) + SHEET_PADDING * (len(tiles) + 1)
+    height = SHEET_HEADER_HEIGHT + max(tile.height for tile in tiles) + SHEET_PADDING
+    sheet = Image.new('RGB', (width, height), SHEET_BACKGROUND)
+
+    draw_title(ImageDraw.Draw(sheet), (SHEET_PADDING, SHEET_HEADER_HEIGHT // 2), title, load_font(32))
+
+    x = SHEET_PADDING
+    for tile in tiles:
+        sheet.paste(tile, (x, SHEET_HEADER_HEIGHT))
+        x += tile.width + SHEET_PADDING
+
+    output = io.BytesIO()
+    sheet.save(output, format='JPEG', quality=80, optimize=True)
+    return output.getvalue()
+
+
+class RenderCache:
+    """Directory of rendered images with LRU eviction under a size budget
+
+    Entries are files named by their cache key. Reading an entry refreshes its
+    modification time, and when the directory grows past `max_bytes` the
+    least recently used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes, suffix='.jpg'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        """Return the file path of a cache key"""
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store bytes under key and evict old entries beyond the budget"""
+        path = self._path(key)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            f.write(data)
+        try:
+            self.total_bytes -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(f.name, path)
+        self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its budget"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and entry.name.endswith(self.suffix)),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.total_bytes -= size
+            logger.debug(f"Evicted {entry.name} from render cache")
+
+
+BRACKET_BOX_WIDTH = 200
+BRACKET_BOX_HEIGHT = 44
+BRACKET_GAP = 12
+BRACKET_CONNECTOR_WIDTH = 32
+BRACKET_HEADER_HEIGHT = 64
+BRACKET_MARGIN = 16
+BRACKET_BOX_COLOR = (44, 47, 58)
+BRACKET_WINNER_COLOR = (201, 162, 39)
+BRACKET_LINE_COLOR = (110, 114, 128)
+BRACKET_MUTED_COLOR = (140, 143, 153)
+BRACKET_NAME_LENGTH = 20
+
+
+def bracket_tile_height(size):
+    """Return the height of a round column for a bracket of `size` leaves"""
+    return (size // 2) * (BRACKET_BOX_HEIGHT + BRACKET_GAP)
+
+
+def render_round_tile(round_number, size, matches, last_round):
+    """Draw one round column of a bracket; returns PNG bytes
+
+    `matches` holds one entry per node of the round, top to bottom: None for
+    an empty node, else (team1 name, team2 name, winning slot or 0).
+    """
+    pitch = (BRACKET_BOX_HEIGHT + BRACKET_GAP) * (1 << (round_number - 1))
+    width = BRACKET_BOX_WIDTH + (0 if last_round else BRACKET_CONNECTOR_WIDTH)
+    tile = Image.new('RGB', (width, bracket_tile_height(size)), SHEET_BACKGROUND)
+    draw = ImageDraw.Draw(tile)
+    font = load_font(15)
+    row_height = BRACKET_BOX_HEIGHT // 2
+
+    for index, match in enumerate(matches):
+        center = int((index + 0.5) * pitch)
+        if match is None:
+            continue
+        top = center - BRACKET_BOX_HEIGHT // 2
+        draw.rectangle((0, top, BRACKET_BOX_WIDTH - 1, top + BRACKET_BOX_HEIGHT - 1), fill=BRACKET_BOX_COLOR)
+        for slot, name in enumerate(match[:2], 1):
+            row_top = top + (slot - 1) * row_height
+            color = SHEET_TEXT_COLOR
+            if match[2] == slot:
+                draw.rectangle((0, row_top, BRACKET_BOX_WIDTH - 1, row_top + row_height - 1), fill=BRACKET_WINNER_COLOR)
+            elif match[2]:
+                color = BRACKET_MUTED_COLOR
+            if len(name) > BRACKET_NAME_LENGTH:
+                name = name[:BRACKET_NAME_LENGTH - 1] + '…'
+            draw_title(draw, (8, row_top + row_height // 2), name, font, fill=color)
+
+        if not last_round:
+            # Elbow towards the next round's box, which sits between this pair
+            middle = BRACKET_BOX_WIDTH + BRACKET_CONNECTOR_WIDTH // 2
+            draw.line((BRACKET_BOX_WIDTH, center, middle, center), fill=BRACKET_LINE_COLOR, width=2)
+            partner_center = int((index + (1.5 if index % 2 == 0 else -0.5)) * pitch)
+            joint = (center + partner_center) // 2
+            draw.line((middle, center, middle, joint), fill=BRACKET_LINE_COLOR, width=2)
+            draw.line((middle, joint, width, joint), fill=BRACKET_LINE_COLOR, width=2)
+
+    output = io.BytesIO()
+    tile.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+def compose_bracket(tiles, title, subtitle):
+    """Place round tiles side by side under a header; returns PNG bytes"""
+    images = [Image.open(io.BytesIO(tile)) for tile in tiles]
+    width = sum(image.width for image in images) + 2 * BRACKET_MARGIN
+    height = BRACKET_HEADER_HEIGHT + max(image.height for image in images) + 2 * BRACKET_MARGIN
+    canvas = Image.new('RGB', (width, height), SHEET_BACKGROUND)
+    draw = ImageDraw.Draw(canvas)
+    draw_title(draw, (BRACKET_MARGIN, BRACKET_MARGIN + 14), title, load_font(28))
+    draw_title(draw, (BRACKET_MARGIN, BRACKET_MARGIN + 44), subtitle, load_font(16), fill=BRACKET_MUTED_COLOR)
+
+    x = BRACKET_MARGIN
+    for image in images:
+        canvas.paste(image, (x, BRACKET_HEADER_HEIGHT + BRACKET_MARGIN))
+        x += image.width
+
+    output = io.BytesIO()
+    canvas.save(output, format='PNG', optimize=True)
+    return output.getvalue()
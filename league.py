@@ -0,0 +1,253 @@
+"""Round-robin and Swiss tournament engines
+
+Both formats play in rounds and share one state layout, with the same
+interface as the elimination engine in bracket.py (round_matches, get_match,
+report_winner and the current_round/status/winner/version fields):
+
+- `teams` is the list of team ids in seed order
+- `matches` holds the current round only, as [team1, team2, winning slot]
+  with team2 None for a bye and slot 0 while undecided; `previous` keeps the
+  last finished round so its results can still be shown
+- `standings` maps team id to [wins, losses] and is updated with every
+  result, so the table never has to be rebuilt from the match history
+
+Rounds are generated when the previous one completes. Round-robin derives
+round r directly with the circle method, so the O(N²) schedule is never
+built. Swiss pairs teams by score, top down, avoiding rematches; it only
+keeps the list of opponents of each team.
+
+A match id is round * ROUND_STRIDE + index, so a button from an old round
+can never report a result for a match of the current one.
+"""
+import math
+
+from bracket import BracketError
+
+ROUND_STRIDE = 1 << 16
+SWISS_PAIRING_STEPS = 100000  # backtracking budget before allowing rematches
+
+
+def create_round_robin(team_ids):
+    """Start a round-robin where every team meets every other team once"""
+    if len(team_ids) < 2:
+        raise BracketError("Need at least 2 teams")
+    slots = len(team_ids) + len(team_ids) % 2
+    return _create('round_robin', team_ids, slots - 1)
+
+
+def create_swiss(team_ids, rounds=None):
+    """Start a Swiss tournament of `rounds` rounds (default: log2 of the team count)"""
+    if len(team_ids) < 2:
+        raise BracketError("Need at least 2 teams")
+    if rounds is None:
+        rounds = math.ceil(math.log2(len(team_ids)))
+    rounds = max(1, min(rounds, len(team_ids) - 1 + len(team_ids) % 2))
+    return _create('swiss', team_ids, rounds, opponents={team_id: [] for team_id in team_ids}, byes=[])
+
+
+def _create(league_format, team_ids, rounds, **extra):
+    """Build the common state and pair the first round"""
+    league = {
+        'format': league_format,
+        'teams': list(team_ids),
+        'rounds': rounds,
+        'current_round': 0,
+        'matches': [],
+        'previous': None,
+        'pending': 0,
+        'standings': {team_id: [0, 0] for team_id in team_ids},
+        'status': 'active',
+        'winner': None,
+        'version': 0,
+        **extra,
+    }
+    _start_round(league)
+    return league
+
+
+def circle_pairs(team_ids, round_index):
+    """Yield the pairs of one round-robin round using the circle method
+
+    The first team stays fixed while the others rotate by one position per
+    round; pairs are read off from both ends. An odd field gets a None
+    opponent, which is a bye.
+    """
+    players = list(team_ids)
+    if len(players) % 2:
+        players.append(None)
+    n = len(players)
+    rest = players[1:]
+    shift = round_index % (n - 1)
+    rotated = [players[0]] + rest[-shift:] + rest[:-shift] if shift else players
+    for i in range(n // 2):
+        team1, team2 = rotated[i], rotated[n - 1 - i]
+        if team1 is None:
+            team1, team2 = team2, team1
+        yield team1, team2
+
+
+def swiss_pairs(league):
+    """Pair the next Swiss round: by score, avoiding rematches where possible"""
+    seeds = {team_id: index for index, team_id in enumerate(league['teams'])}
+    standings = league['standings']
+    order = sorted(league['teams'], key=lambda t: (-standings[t][0], seeds[t]))
+
+    pairs = []
+    if len(order) % 2:
+        # The lowest ranked team that has not had a bye sits this round out
+        had_bye = set(league['byes'])
+        bye = next((t for t in reversed(order) if t not in had_bye), order[-1])
+        order.remove(bye)
+        pairs.append((bye, None))
+
+    opponents = {team_id: set(ids) for team_id, ids in league['opponents'].items()}
+    matched = _pair_without_rematches(order, opponents, SWISS_PAIRING_STEPS)
+    if matched is None:
+        # Every pairing repeats a match; play neighbours in the standings
+        matched = [(order[i], order[i + 1]) for i in range(0, len(order), 2)]
+    return matched + pairs
+
+
+def _pair_without_rematches(order, opponents, max_steps):
+    """Pair teams in order, each with the highest ranked possible opponent
+
+    Depth-first search with an explicit stack: when a team has no opponent
+    left it has not played, the previous pair is undone and tries its next
+    candidate. Returns None if no rematch-free pairing was found within
+    max_steps.
+    """
+    n = len(order)
+    used = [False] * n
+    stack = []
+    i, j = 0, 0
+    for _ in range(max_steps):
+        while i < n and used[i]:
+            i += 1
+        if i == n:
+            return [(order[a], order[b]) for a, b in stack]
+        j = max(j, i + 1)
+        played = opponents[order[i]]
+        while j < n and (used[j] or order[j] in played):
+            j += 1
+        if j < n:
+            used[i] = used[j] = True
+            stack.append((i, j))
+            i, j = i + 1, 0
+        elif stack:
+            i, j = stack.pop()
+            used[i] = used[j] = False
+            j += 1
+        else:
+            return None
+    return None
+
+
+def _start_round(league):
+    """Generate and store the next round, or finish the league"""
+    if league['current_round']:
+        league['previous'] = {'round': league['current_round'], 'matches': league['matches']}
+    if league['current_round'] >= league['rounds']:
+        _finish(league)
+        return
+
+    league['current_round'] += 1
+    if league['format'] == 'round_robin':
+        pairs = circle_pairs(league['teams'], league['current_round'] - 1)
+    else:
+        pairs = swiss_pairs(league)
+
+    league['matches'] = []
+    league['pending'] = 0
+    for team1, team2 in pairs:
+        if team2 is None:
+            league['matches'].append([team1, None, 1])
+            if league['format'] == 'swiss':
+                # A Swiss bye scores as a win
+                league['byes'].append(team1)
+                league['standings'][team1][0] += 1
+            continue
+        league['matches'].append([team1, team2, 0])
+        league['pending'] += 1
+        if league['format'] == 'swiss':
+            league['opponents'][team1].append(team2)
+            league['opponents'][team2].append(team1)
+
+    if not league['pending']:
+        _start_round(league)
+
+
+def _finish(league):
+    """Mark the league finished with the leader of the standings as winner"""
+    seeds = {team_id: index for index, team_id in enumerate(league['teams'])}
+    standings = league['standings']
+    league['status'] = 'finished'
+    league['winner'] = min(league['teams'], key=lambda t: (-standings[t][0], standings[t][1], seeds[t]))
+
+
+def _match_view(league, round_number, index, match):
+    """Return the dict form of one stored match"""
+    team1, team2, slot = match
+    return {
+        'id': round_number * ROUND_STRIDE + index,
+        'round': round_number,
+        'team1': team1,
+        'team2': team2,
+        'winner': (team1, team2)[slot - 1] if slot else None,
+    }
+
+
+def round_matches(league, round_number):
+    """Return the matches of the current or previous round; byes have team2 None"""
+    if round_number == league['current_round'] and league['status'] != 'finished':
+        matches = league['matches']
+    elif league['previous'] and league['previous']['round'] == round_number:
+        matches = league['previous']['matches']
+    else:
+        return []
+    return [_match_view(league, round_number, index, match) for index, match in enumerate(matches)]
+
+
+def get_match(league, match_id):
+    """Return a view of one real match of the current round, or None"""
+    round_number, index = divmod(match_id, ROUND_STRIDE)
+    if round_number != league['current_round'] or league['status'] == 'finished':
+        return None
+    if not 0 <= index < len(league['matches']) or league['matches'][index][1] is None:
+        return None
+    return _match_view(league, round_number, index, league['matches'][index])
+
+
+def report_winner(league, match_id, slot):
+    """Record the winner of a match by slot (1 or 2)
+
+    Returns the number of the round this result completed, or None.
+    """
+    match = get_match(league, match_id)
+    if match is None:
+        raise BracketError("Match not found")
+    if match['winner'] is not None:
+        raise BracketError("Winner already reported")
+    if slot not in (1, 2):
+        raise BracketError("Invalid team")
+
+    stored = league['matches'][match_id % ROUND_STRIDE]
+    stored[2] = slot
+    winner, loser = (stored[0], stored[1]) if slot == 1 else (stored[1], stored[0])
+    league['standings'][winner][0] += 1
+    league['standings'][loser][1] += 1
+    league['version'] += 1
+
+    league['pending'] -= 1
+    if league['pending'] > 0:
+        return None
+    round_number = league['current_round']
+    _start_round(league)
+    return round_number
+
+
+def standings(league):
+    """Return (team id, wins, losses) rows, best first"""
+    seeds = {team_id: index for index, team_id in enumerate(league['teams'])}
+    table = league['standings']
+    ranked = sorted(league['teams'], key=lambda t: (-table[t][0], table[t][1], seeds[t]))
+    return [(team_id, table[team_id][0], table[team_id][1]) for team_id in ranked]
@@ -0,0 +1,420 @@
+"""Offline load simulation of the bot
+
+Drives the real handlers in main.py (button_handler, handle_message,
+handle_photo, create_tournament, generate_bracket and report_match_winner
+through button_handler) with fake Telegram objects. The fake bot answers
+every API call after an artificial latency and never touches the network.
+
+The simulation creates the tournaments, registers every team concurrently
+(menu, name, leader, three roster photos) and plays every tournament to
+the end, clicking all pending results of a round at once. It then reports
+handler latency percentiles, API calls per operation, bytes persisted and
+peak RSS.
+
+    python loadtest.py --tournaments 4 --teams 64 --latency-ms 40
+    python loadtest.py --format swiss --storage journal --json
+
+Each run works in a fresh temporary directory, so it never reads or
+changes the bot's real data.
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+operation = contextvars.ContextVar('operation', default='background')
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakePhotoSize:
+    def __init__(self, file_id, file_unique_id):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+
+
+class FakeFile:
+    def __init__(self, bot, file_id):
+        self.bot = bot
+        self.file_id = file_id
+
+    async def download_as_bytearray(self):
+        await self.bot.call('download_file')
+        return bytearray(self.bot.photo_bytes(self.file_id))
+
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, message_id=None, text=None, photo=None, media_group_id=None):
+        self.bot = bot
+        self.chat = FakeChat(chat_id)
+        self.chat_id = chat_id
+        self.message_id = message_id if message_id is not None else next(bot.message_ids)
+        self.text = text
+        self.photo = photo or []
+        self.media_group_id = media_group_id
+        self.caption = None
+        self.document = None
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(chat_id=self.chat_id, text=text, **kwargs)
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot, user_id, data):
+        self.bot = bot
+        self.from_user = FakeUser(user_id)
+        self.data = data
+        self.message = FakeMessage(bot, user_id)
+
+    async def answer(self, text=None, show_alert=False):
+        await self.bot.call('answer_callback_query')
+
+    async def edit_message_text(self, text, **kwargs):
+        return await self.bot.edit_message_text(chat_id=self.message.chat_id, text=text, **kwargs)
+
+    async def edit_message_reply_markup(self, **kwargs):
+        return await self.bot.edit_message_reply_markup(chat_id=self.message.chat_id, **kwargs)
+
+
+class FakeUpdate:
+    def __init__(self, user_id, message=None, callback_query=None):
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeChat(user_id)
+        self.message = message
+        self.callback_query = callback_query
+
+
+class FakeApplication:
+    def create_task(self, coroutine):
+        return asyncio.get_running_loop().create_task(coroutine)
+
+
+class FakeContext:
+    def __init__(self, bot, args=None):
+        self.bot = bot
+        self.args = args or []
+        self.application = FakeApplication()
+
+
+class FakeBot:
+    """Bot API stand-in that counts calls and answers after a delay"""
+
+    def __init__(self, latency, jitter):
+        self.latency = latency
+        self.jitter = jitter
+        self.message_ids = itertools.count(1)
+        self.calls = defaultdict(Counter)  # operation -> method -> calls
+        self._photos = {}
+
+    async def call(self, method):
+        """Account for one API call and wait for its simulated round trip"""
+        self.calls[operation.get()][method] += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def photo_bytes(self, file_id):
+        """Return a small JPEG that is unique to file_id"""
+        if file_id not in self._photos:
+            from PIL import Image
+            color = tuple(random.randrange(256) for _ in range(3))
+            output = io.BytesIO()
+            Image.new('RGB', (64, 64), color).save(output, format='JPEG')
+            self._photos[file_id] = output.getvalue()
+        return self._photos[file_id]
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.call('send_message')
+        return FakeMessage(self, chat_id, text=text)
+
+    async def edit_message_text(self, chat_id=None, text=None, **kwargs):
+        await self.call('edit_message_text')
+        return FakeMessage(self, chat_id, message_id=kwargs.get('message_id'), text=text)
+
+    async def edit_message_reply_markup(self, chat_id=None, **kwargs):
+        await self.call('edit_message_reply_markup')
+        return FakeMessage(self, chat_id, message_id=kwargs.get('message_id'))
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await self.call('send_photo')
+        file_id = f"sent{next(self.message_ids)}"
+        return FakeMessage(self, chat_id, photo=[FakePhotoSize(file_id, file_id)])
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        await self.call('send_media_group')
+        messages = []
+        for _ in media:
+            file_id = f"sent{next(self.message_ids)}"
+            messages.append(FakeMessage(self, chat_id, photo=[FakePhotoSize(file_id, file_id)]))
+        return messages
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await self.call('send_document')
+        return FakeMessage(self, chat_id)
+
+    async def get_file(self, file_id):
+        await self.call('get_file')
+        return FakeFile(self, file_id)
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Simulation:
+    """One load run against a freshly imported main module"""
+
+    def __init__(self, main, args):
+        self.main = main
+        self.args = args
+        self.bot = FakeBot(args.latency_ms / 1000, args.jitter_ms / 1000)
+        self.admin = main.ADMINS[0]
+        self.latencies = defaultdict(list)  # operation -> seconds
+        self.slots = asyncio.Semaphore(args.concurrency)
+        self.user_ids = itertools.count(1000000)
+        self.photo_ids = itertools.count(1)
+
+    async def run_handler(self, name, handler, update, context):
+        """Run one handler like the application would and time it"""
+        async with self.slots:
+            token = operation.set(name)
+            started = time.perf_counter()
+            try:
+                await handler(update, context)
+            finally:
+                self.latencies[name].append(time.perf_counter() - started)
+                operation.reset(token)
+
+    async def click(self, name, user_id, data):
+        """Press an inline button"""
+        query = FakeCallbackQuery(self.bot, user_id, data)
+        await self.run_handler(name, self.main.button_handler, FakeUpdate(user_id, callback_query=query), FakeContext(self.bot))
+
+    async def send_text(self, name, handler, user_id, text, args=None):
+        """Send a text message or command"""
+        message = FakeMessage(self.bot, user_id, text=text)
+        await self.run_handler(name, handler, FakeUpdate(user_id, message=message), FakeContext(self.bot, args))
+
+    async def send_photo(self, user_id, media_group_id=None):
+        """Send one roster photo"""
+        number = next(self.photo_ids)
+        photo = [FakePhotoSize(f"photo{number}", f"unique{number}")]
+        message = FakeMessage(self.bot, user_id, photo=photo, media_group_id=media_group_id)
+        await self.run_handler('handle_photo', self.main.handle_photo, FakeUpdate(user_id, message=message), FakeContext(self.bot))
+
+    async def create_tournaments(self):
+        """Create the tournaments through /create"""
+        before = set(self.main.tournaments)
+        format_args = [] if self.args.format == 'elimination' else [self.args.format]
+        for number in range(self.args.tournaments):
+            await self.send_text(
+                'create_tournament', self.main.create_tournament, self.admin, '/create',
+                [f"Cup{number}", str(self.args.teams), *format_args, 'Load', 'test']
+            )
+        return [tournament_id for tournament_id in self.main.tournaments if tournament_id not in before]
+
+    async def register(self, tournament_id, number):
+        """Walk one user through a complete registration"""
+        main = self.main
+        user_id = next(self.user_ids)
+        await self.click('view_tournaments', user_id, main.encode_callback('tournaments', page=0))
+        await self.click('join_tournament', user_id, main.encode_callback('join_tournament', tournament_id=tournament_id))
+        await self.send_text('team_name', main.handle_message, user_id, f"Team {tournament_id} {number}")
+        await self.send_text('leader_username', main.handle_message, user_id, f"leader{number}")
+        if self.args.albums:
+            media_group_id = f"album{user_id}"
+            await asyncio.gather(*(self.send_photo(user_id, media_group_id) for _ in range(3)))
+        else:
+            for _ in range(3):
+                await self.send_photo(user_id)
+
+    async def play(self, tournament_id):
+        """Report results until the tournament is finished"""
+        main = self.main
+        while True:
+            bracket = main.tournaments[tournament_id]['bracket']
+            if bracket['status'] == 'finished':
+                return
+            pending = [
+                match for match in main.engine(bracket).round_matches(bracket, bracket['current_round'])
+                if match['team2'] and not match['winner']
+            ]
+            await asyncio.gather(*(
+                self.click('report_winner', self.admin, main.encode_callback(
+                    'report_winner', match_id=match['id'], slot=random.choice((1, 2)),
+                    page=0, tournament_id=tournament_id
+                ))
+                for match in pending
+            ))
+
+    async def start(self):
+        """Load state and start the background workers, as post_init does for the application
+
+        Runs outside any operation so the workers' calls count as background.
+        """
+        main = self.main
+        state, _ = await asyncio.to_thread(main.read_state)
+        main.install_state(state)
+        main.state_ready.set()
+        main.persistence.start()
+        main.user_states.start()
+        main.outbox.start(self.bot)
+        main.dispatcher.start()
+        main.roster_downloader.start()
+
+    async def run(self):
+        """Run every phase and return the report"""
+        main = self.main
+        started = time.perf_counter()
+        await self.start()
+
+        tournament_ids = await self.create_tournaments()
+        await asyncio.gather(*(
+            self.register(tournament_id, number)
+            for tournament_id in tournament_ids
+            for number in range(self.args.teams)
+        ))
+        if self.args.albums:
+            await asyncio.sleep(main.ALBUM_COLLECT_SECONDS * 2)
+        registered = time.perf_counter()
+
+        await asyncio.gather(*(
+            self.send_text('generate_bracket', main.generate_bracket, self.admin, '/generate_bracket', [tournament_id])
+            for tournament_id in tournament_ids
+        ))
+        await asyncio.gather(*(self.play(tournament_id) for tournament_id in tournament_ids))
+        played = time.perf_counter()
+
+        await main.post_stop(None)
+        await main.post_shutdown(None)
+        main.store.close()
+        finished = time.perf_counter()
+
+        return self.report(tournament_ids, {
+            'registration': registered - started,
+            'playthrough': played - registered,
+            'shutdown': finished - played,
+            'total': finished - started,
+        })
+
+    def report(self, tournament_ids, phases):
+        """Summarize the run"""
+        main = self.main
+        operations = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            calls = self.bot.calls.get(name, Counter())
+            operations[name] = {
+                'count': len(values),
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+                'max_ms': values[-1] * 1000,
+                'api_calls_per_op': sum(calls.values()) / len(values),
+            }
+        finished = sum(1 for t in tournament_ids if main.tournaments[t]['bracket']['status'] == 'finished')
+        return {
+            'config': vars(self.args),
+            'phases_s': phases,
+            'operations': operations,
+            'background_api_calls': dict(self.bot.calls.get('background', Counter())),
+            'api_calls_total': sum(sum(c.values()) for c in self.bot.calls.values()),
+            'teams_registered': len(main.teams),
+            'tournaments_finished': finished,
+            'bytes_persisted': main.persistence.bytes_written,
+            'flushes': main.persistence.flush_count,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
+
+def print_report(report):
+    """Print a report as tables"""
+    phases = report['phases_s']
+    print(f"Phases: registration {phases['registration']:.2f}s, playthrough {phases['playthrough']:.2f}s, "
+          f"shutdown {phases['shutdown']:.2f}s, total {phases['total']:.2f}s")
+    print()
+    print(f"{'operation':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'API/op':>8}")
+    for name, stats in report['operations'].items():
+        print(f"{name:<20}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}{stats['api_calls_per_op']:>8.2f}")
+    print()
+    background = ', '.join(f"{method} {count}" for method, count in sorted(report['background_api_calls'].items()))
+    print(f"Background API calls: {background or 'none'}")
+    print(f"API calls total: {report['api_calls_total']}")
+    print(f"Teams registered: {report['teams_registered']}, tournaments finished: {report['tournaments_finished']}")
+    print(f"Bytes persisted: {report['bytes_persisted']} in {report['flushes']} flushes")
+    print(f"Peak RSS: {report['peak_rss_mb']:.1f} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load simulation of the bot handlers")
+    parser.add_argument('--tournaments', type=int, default=4, help="tournaments to create and play")
+    parser.add_argument('--teams', type=int, default=32, help="teams registered per tournament")
+    parser.add_argument('--format', choices=['elimination', 'swiss', 'roundrobin'], default='elimination')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help="simulated API round trip")
+    parser.add_argument('--jitter-ms', type=float, default=10.0, help="random variation of the round trip")
+    parser.add_argument('--concurrency', type=int, default=64, help="updates handled at the same time")
+    parser.add_argument('--albums', action='store_true', help="send rosters as albums instead of single photos")
+    parser.add_argument('--storage', choices=['sqlite', 'journal'], default='sqlite')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help="keep the temporary data directory")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    # main.py opens its storage relative to the working directory on import
+    workdir = tempfile.mkdtemp(prefix='brawl-loadtest-')
+    os.environ['STORAGE_BACKEND'] = args.storage
+    os.environ.setdefault('ALBUM_COLLECT_SECONDS', '0.2')
+    os.environ.setdefault('METRICS_PORT', '0')
+    # Admin notifications are rate limited per chat; lift the limits so the
+    # run measures the bot rather than Telegram's flood control
+    os.environ.setdefault('BROADCAST_GLOBAL_RATE', '100000')
+    os.environ.setdefault('BROADCAST_CHAT_RATE', '100000')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    try:
+        import main as bot_main
+        logging.getLogger().setLevel(logging.WARNING)
+        report = asyncio.run(Simulation(bot_main, args).run())
+    finally:
+        if args.keep:
+            print(f"Data kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLocks:
+    """One asyncio lock per key, created on demand
+
+    A lock is dropped as soon as no task holds or waits for it, so the number
+    of locks is bounded by the number of keys in use rather than every key
+    ever seen.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, holders and waiters]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        """Hold the lock of one key for the duration of the block"""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
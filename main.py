@@ -1,10 +1,39 @@
+import asyncio
+import gc
+import hashlib
 import logging
 import random
 import json
 import os
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+STARTED_AT = time.perf_counter()  # before the heavy imports, so startup timing includes them
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ContextTypes
+from callbacks import CallbackError, decode as decode_callback, encode as encode_callback
+import bracket as elimination
+import league
+from bracket import BYE, BracketError, bracket_from_pairs, create_bracket, round_nodes
+from archive import TournamentArchive
+from bulk import FORMATS as EXPORT_FORMATS, RESULT_TYPES, BulkError, ExportWriter, field, read_rows
+from conversations import ConversationStore
+from dispatcher import Dispatcher
+from ids import IdAllocator
+from imaging import RenderCache, compose_bracket, render_contact_sheet, render_round_tile
+from league import create_round_robin, create_swiss
+from locks import KeyedLocks
+from media import RosterDownloader
+from metrics import InstrumentedRequest, Registry, serve as serve_metrics, timed
+from outbox import Outbox
+from storage import JournalStore, SQLiteStore, WarmSnapshot, WriteBehind
+from viewcache import ALL_TOURNAMENTS, ViewCache
 
 # Enable logging
 logging.basicConfig(
@@ -17,121 +46,575 @@ logger = logging.getLogger(__name__)
 ADMINS = [123456789, 987654321]  # Replace with your Telegram user IDs
 TOURNAMENTS_FILE = 'data/tournaments.json'
 TEAMS_FILE = 'data/teams.json'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')  # 'sqlite' or 'journal'
+STATE_DB_FILE = 'data/state.db'
+STATE_SNAPSHOT_FILE = 'data/state.snapshot'
+STATE_JOURNAL_FILE = 'data/state.journal'
+WARM_SNAPSHOT_FILE = 'data/state.warm'
+ARCHIVE_DIR = 'data/archive'
+JOURNAL_COMPACT_EVERY = int(os.getenv('JOURNAL_COMPACT_EVERY', 500))
+FLUSH_INTERVAL_MS = int(os.getenv('FLUSH_INTERVAL_MS', 200))
+ROUND_PAGE_SIZE = int(os.getenv('ROUND_PAGE_SIZE', 8))  # matches per page on round messages
+MENU_PAGE_SIZE = int(os.getenv('MENU_PAGE_SIZE', 10))  # buttons per page on team and tournament menus
+ROSTER_DOWNLOAD_CONCURRENCY = int(os.getenv('ROSTER_DOWNLOAD_CONCURRENCY', 4))
+ALBUM_COLLECT_SECONDS = float(os.getenv('ALBUM_COLLECT_SECONDS', 1.0))  # wait for the rest of an album
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+RENDER_CACHE_MB = int(os.getenv('RENDER_CACHE_MB', 64))
+BRACKET_TILE_CACHE_SIZE = int(os.getenv('BRACKET_TILE_CACHE_SIZE', 256))  # rendered round columns kept in memory
+MAX_BRACKET_IMAGE_TEAMS = 128
+CONVERSATION_TTL = int(os.getenv('CONVERSATION_TTL', 3600))  # seconds an unfinished registration is kept
+MAX_CONVERSATIONS = int(os.getenv('MAX_CONVERSATIONS', 10000))
+PERSIST_CONVERSATIONS = os.getenv('PERSIST_CONVERSATIONS', '1') == '1'  # keep registrations across restarts
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 64))  # updates processed at the same time
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 8))
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', 30))  # messages per second, all chats
+BROADCAST_CHAT_RATE = float(os.getenv('BROADCAST_CHAT_RATE', 1))  # messages per second, per private chat
+VIEW_CACHE_SIZE = int(os.getenv('VIEW_CACHE_SIZE', 1024))  # rendered menus kept in memory
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))  # Prometheus endpoint, 0 disables it
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))  # sends of a notification before it is dead-lettered
+OUTBOX_RETRY_SECONDS = float(os.getenv('OUTBOX_RETRY_SECONDS', 5))  # first retry delay, doubled on every attempt
+ARCHIVE_AFTER = int(os.getenv('ARCHIVE_AFTER', 3600))  # seconds a finished tournament stays in memory
+ARCHIVE_CACHE_SIZE = int(os.getenv('ARCHIVE_CACHE_SIZE', 32))  # archived tournaments kept loaded for history views
+TIERING_INTERVAL = int(os.getenv('TIERING_INTERVAL', 600))  # seconds between archiving and roster cleanup passes
+ROSTER_GC_MIN_AGE = int(os.getenv('ROSTER_GC_MIN_AGE', 86400))  # unused roster photos younger than this are kept
+IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', 5 * 1024 * 1024))  # largest file /import accepts
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 5000))
+IMPORT_ERRORS_SHOWN = 20
+STANDINGS_LIMIT = 50  # rows shown in a standings message
+MESSAGE_LIMIT = 4096  # longest text Telegram accepts in a message
 DATA_DIR = 'data'
 ROSTERS_DIR = 'rosters'
+CACHE_DIR = 'cache'
 
-# Ensure directories exist
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(ROSTERS_DIR, exist_ok=True)
+# Tournament formats: engine module, display name and the words accepted by /create
+FORMAT_ENGINES = {'single_elimination': elimination, 'round_robin': league, 'swiss': league}
+FORMAT_NAMES = {'single_elimination': 'Single elimination', 'round_robin': 'Round robin', 'swiss': 'Swiss'}
+FORMAT_ALIASES = {
+    'elimination': 'single_elimination', 'single_elimination': 'single_elimination', 'se': 'single_elimination',
+    'roundrobin': 'round_robin', 'round_robin': 'round_robin', 'rr': 'round_robin',
+    'swiss': 'swiss',
+}
 
 def load_data(filename):
-    """Load data from JSON file"""
+    """Load data from a legacy JSON file"""
     try:
         with open(filename, 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return {}
 
-def save_data(data, filename):
-    """Save data to JSON file"""
+def create_store():
+    """Open the configured storage backend"""
+    if STORAGE_BACKEND == 'journal':
+        return JournalStore(STATE_SNAPSHOT_FILE, STATE_JOURNAL_FILE, compact_every=JOURNAL_COMPACT_EVERY)
+    return SQLiteStore(STATE_DB_FILE)
+
+def read_state():
+    """Read the working set, importing the legacy JSON files on first run
+
+    Blocking; runs in a thread while the bot is already listening. A warm
+    snapshot that matches the backend files is used instead of the backend,
+    which is then opened in the background. Returns the state and its source.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(ROSTERS_DIR, exist_ok=True)
+    # Decoding creates every record at once; cyclic GC passes over them meanwhile
+    # only cost time, as nothing loaded is garbage
+    gc.disable()
     try:
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=4)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving data: {e}")
-        return False
+        state = warm_snapshot.load()
+        if state is not None:
+            store.open_in_background()
+            return state, 'snapshot'
+        state = store.load()
+        if store.is_new:
+            state = {'tournaments': load_data(TOURNAMENTS_FILE), 'teams': load_data(TEAMS_FILE)}
+            store.import_state(state)
+            logger.info(f"Imported {len(state['tournaments'])} tournaments and {len(state['teams'])} teams from JSON")
+        return state, STORAGE_BACKEND
+    finally:
+        gc.enable()
 
-# Load existing data
-tournaments = load_data(TOURNAMENTS_FILE)
-teams = load_data(TEAMS_FILE)
-user_states = {}
+def mark_dirty(collection, key):
+    """Queue the current value of one record, or its deletion, for the flusher
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send welcome message with main menu"""
-    user_id = update.effective_user.id
+    Menus showing a changed tournament or team are invalidated as well.
+    """
+    if collection == 'tournaments' and key in tournaments:
+        view_cache.bump(key)
+    elif collection == 'teams' and key in teams:
+        view_cache.bump(teams[key].get('tournament_id'))
+    persistence.mark_dirty(collection, key)
+
+async def flush_now():
+    """Persist every pending change before continuing"""
+    return await persistence.flush()
+
+# State, filled by load_state() once the event loop runs; nothing is read at import
+store = create_store()
+warm_snapshot = WarmSnapshot(WARM_SNAPSHOT_FILE, store.files)
+tournaments = {}
+teams = {}
+meta = {}
+collections = {'tournaments': tournaments, 'teams': teams, 'meta': meta}
+archive = TournamentArchive(ARCHIVE_DIR)  # finished tournaments moved out of the working set
+archive_cache = OrderedDict()  # tournament id -> archived record loaded for a history view, oldest first
+archived_teams = {}  # team id -> team of a tournament in archive_cache
+state_ready = asyncio.Event()  # set once state is loaded; updates wait for it
+
+# Instrumentation, exposed on METRICS_PORT and summarized by /stats
+metrics = Registry()
+handler_latency = metrics.histogram('bot_handler_seconds', "Latency of update handlers", 'handler')
+callback_latency = metrics.histogram('bot_callback_seconds', "Latency of callback routes", 'route')
+api_calls = metrics.counter('bot_api_calls_total', "Bot API requests sent", 'method')
+retry_after_hits = metrics.counter('bot_api_retry_after_total', "Bot API requests answered with RetryAfter", 'method')
+save_latency = metrics.histogram('bot_save_seconds', "Duration of state writes")
+save_bytes = metrics.counter('bot_save_bytes_total', "Bytes of state written")
+archived_count = metrics.counter('bot_archived_tournaments_total', "Finished tournaments moved to the archive")
+roster_files_removed = metrics.counter('bot_roster_files_removed_total', "Roster photos deleted because no team uses them")
+
+def record_save(latency, size):
+    """Account for one persisted batch"""
+    save_latency.observe(latency)
+    save_bytes.inc(amount=size)
+
+persistence = WriteBehind(store, collections, window=FLUSH_INTERVAL_MS / 1000, on_flush=record_save)
+
+def save_id_counter(last):
+    """Persist the id counter with the next flush, next to the record using the id"""
+    meta['ids'] = {'last': last}
+    mark_dirty('meta', 'ids')
+
+id_allocator = IdAllocator(on_change=save_id_counter)
+
+def migrate_legacy_bracket(bracket):
+    """Convert a legacy match-list bracket into the bracket engine format
+
+    Team dicts embedded in matches are replaced by their ids, and the
+    current round's pairings and reported winners become the first round of
+    the new tree. Earlier rounds are already decided and are not carried over.
+    """
+    current_round = bracket.get('current_round', 1)
+    current_matches = []
+    for match in bracket['matches']:
+        for slot in ('team1', 'team2'):
+            if isinstance(match.get(slot), dict):
+                match[slot] = match[slot]['id']
+        if match.get('round', 1) == current_round:
+            current_matches.append(match)
+    
+    new_bracket = bracket_from_pairs([(m['team1'], m['team2']) for m in current_matches])
+    first_match_id = new_bracket['size'] // 2
+    for index, match in enumerate(current_matches):
+        if match['team2'] and match.get('winner'):
+            elimination.report_winner(new_bracket, first_match_id + index, 1 if match['winner'] == match['team1'] else 2)
+    return new_bracket
+
+def migrate_brackets():
+    """Bring brackets stored in older formats up to date
+
+    The buttons of legacy per-match messages no longer decode, so admins get
+    a round message for every migrated bracket that is still being played.
+    It is queued under a fixed key and written in the same flush as the
+    migrated bracket, so it goes out once.
+    
+    Older versions never marked a tournament finished. Tournaments whose
+    bracket is finished are marked now, so the tiering pass archives them
+    ARCHIVE_AFTER seconds later.
+    """
+    for tournament_id, tournament in tournaments.items():
+        bracket = tournament.get('bracket', {})
+        if 'matches' in bracket and 'format' not in bracket:
+            bracket = tournament['bracket'] = migrate_legacy_bracket(bracket)
+            mark_dirty('tournaments', tournament_id)
+            logger.info(f"Migrated bracket of {tournament_id} to the bracket engine format")
+            if bracket['status'] != 'finished':
+                queue_round_message(tournament_id, bracket['current_round'], f"migrated:{tournament_id}")
+        if bracket.get('status') == 'finished' and tournament['status'] != 'finished':
+            tournament['finished_at'] = datetime.now().isoformat()
+            set_tournament_status(tournament_id, 'finished')
+            mark_dirty('tournaments', tournament_id)
+
+user_states = ConversationStore(
+    CONVERSATION_TTL,
+    MAX_CONVERSATIONS,
+    on_change=partial(mark_dirty, 'user_states') if PERSIST_CONVERSATIONS else None
+)
+if PERSIST_CONVERSATIONS:
+    collections['user_states'] = user_states.entries
+render_cache = None  # RenderCache, opened by load_state()
+view_cache = ViewCache(VIEW_CACHE_SIZE)  # rendered menus, invalidated through mark_dirty and the index helpers
+render_pool = None
+bracket_tiles = OrderedDict()  # tile key -> PNG bytes of one rendered round column
+tournament_locks = KeyedLocks()  # registration and bracket changes of one tournament
+user_locks = KeyedLocks()        # conversation state of one user
+pending_albums = {}  # (user_id, media_group_id) -> (first update, photos)
+roster_downloader = RosterDownloader(ROSTERS_DIR, concurrency=ROSTER_DOWNLOAD_CONCURRENCY)
+dispatcher = Dispatcher(
+    concurrency=BROADCAST_CONCURRENCY,
+    global_rate=BROADCAST_GLOBAL_RATE,
+    chat_rate=BROADCAST_CHAT_RATE
+)
+outbox = Outbox(
+    dispatcher,
+    flush_now,
+    on_change=partial(mark_dirty, 'outbox'),
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    base_delay=OUTBOX_RETRY_SECONDS
+)
+collections['outbox'] = outbox.entries
+metrics_server = None
+tiering_task = None
+
+metrics.gauge('bot_tournaments', "Tournaments held in memory", lambda: len(tournaments))
+metrics.gauge('bot_teams', "Teams held in memory", lambda: len(teams))
+metrics.gauge('bot_user_states', "Unfinished conversations", lambda: len(user_states))
+metrics.gauge('bot_dispatcher_queued', "Notifications waiting to be sent", lambda: dispatcher.pending())
+metrics.gauge('bot_outbox_entries', "Outbox entries by delivery status", outbox.counts, 'status')
+metrics.gauge('bot_outbox_delivered', "Outbox entries delivered since start", lambda: outbox.sent)
+metrics.gauge('bot_outbox_retries', "Outbox sends retried since start", lambda: outbox.retried)
+metrics.gauge('bot_view_cache_hits', "Menus served from the view cache", lambda: view_cache.hits, 'view')
+metrics.gauge('bot_view_cache_misses', "Menus rendered because the view cache had no current copy", lambda: view_cache.misses, 'view')
+metrics.gauge('bot_view_cache_hit_ratio', "Share of menu lookups served from the view cache", view_cache.hit_rates, 'view')
+metrics.gauge('bot_startup_phase_seconds', "Duration of each startup phase", lambda: startup_phases, 'phase')
+metrics.gauge(
+    'bot_time_to_first_response_seconds', "Time from process start to the first handled update",
+    lambda: time_to_first_response or 0.0
+)
+
+# Secondary indexes over `teams`, kept in sync by add_team/remove_team
+teams_by_tournament = {}  # tournament_id -> {team_id: None}, in registration order
+team_name_index = {}      # (tournament_id, normalized name) -> team_id
+active_team_counts = {}   # tournament_id -> number of active teams
+tournaments_by_status = {}  # status -> {tournament_id: None}, in the order they got that status
+
+def normalize_team_name(name):
+    """Normalize a team name for duplicate checks"""
+    return name.strip().casefold()
+
+def index_team(team):
+    """Add a team to the secondary indexes"""
+    tournament_id = team.get('tournament_id')
+    teams_by_tournament.setdefault(tournament_id, {})[team['id']] = None
+    team_name_index[(tournament_id, normalize_team_name(team.get('name', '')))] = team['id']
+    if team.get('status') == 'active':
+        active_team_counts[tournament_id] = active_team_counts.get(tournament_id, 0) + 1
+
+def unindex_team(team):
+    """Remove a team from the secondary indexes"""
+    tournament_id = team.get('tournament_id')
+    tournament_team_ids = teams_by_tournament.get(tournament_id)
+    if tournament_team_ids is not None:
+        tournament_team_ids.pop(team['id'], None)
+        if not tournament_team_ids:
+            del teams_by_tournament[tournament_id]
+    name_key = (tournament_id, normalize_team_name(team.get('name', '')))
+    if team_name_index.get(name_key) == team['id']:
+        del team_name_index[name_key]
+    if team.get('status') == 'active':
+        remaining = active_team_counts.get(tournament_id, 0) - 1
+        if remaining > 0:
+            active_team_counts[tournament_id] = remaining
+        else:
+            active_team_counts.pop(tournament_id, None)
+
+def rebuild_indexes():
+    """Rebuild all secondary indexes from `teams` and `tournaments`"""
+    teams_by_tournament.clear()
+    team_name_index.clear()
+    active_team_counts.clear()
+    tournaments_by_status.clear()
+    for team in teams.values():
+        index_team(team)
+    for tournament_id, tournament in tournaments.items():
+        tournaments_by_status.setdefault(tournament['status'], {})[tournament_id] = None
+
+def add_team(team):
+    """Store a team and index it"""
+    if team['id'] in teams:
+        unindex_team(teams[team['id']])
+    teams[team['id']] = team
+    index_team(team)
+    view_cache.bump(team.get('tournament_id'))
+
+def remove_team(team_id):
+    """Delete a team and drop it from the indexes"""
+    team = teams.pop(team_id, None)
+    if team is not None:
+        unindex_team(team)
+        tournament_id = team.get('tournament_id')
+        view_cache.bump(tournament_id if tournament_id in tournaments else ALL_TOURNAMENTS)
+    return team
+
+def add_tournament(tournament_id, tournament):
+    """Store a tournament and index it by status"""
+    tournaments[tournament_id] = tournament
+    tournaments_by_status.setdefault(tournament['status'], {})[tournament_id] = None
+    view_cache.bump(tournament_id)
+
+def remove_tournament(tournament_id):
+    """Delete a tournament and drop it from the status index"""
+    tournament = tournaments.pop(tournament_id, None)
+    if tournament is not None:
+        tournaments_by_status.get(tournament['status'], {}).pop(tournament_id, None)
+        view_cache.forget(tournament_id)
+    return tournament
+
+def set_tournament_status(tournament_id, status):
+    """Change the status of a tournament and move it in the status index"""
+    tournament = tournaments[tournament_id]
+    tournaments_by_status.get(tournament['status'], {}).pop(tournament_id, None)
+    tournament['status'] = status
+    tournaments_by_status.setdefault(status, {})[tournament_id] = None
+    view_cache.bump(tournament_id)
+
+def get_tournament_teams(tournament_id, active_only=False):
+    """Return the teams of a tournament in registration order"""
+    tournament_teams = [teams[team_id] for team_id in teams_by_tournament.get(tournament_id, ())]
+    if active_only:
+        return [t for t in tournament_teams if t.get('status') == 'active']
+    return tournament_teams
+
+def count_tournament_teams(tournament_id, active_only=False):
+    """Return the number of teams in a tournament"""
+    if active_only:
+        return active_team_counts.get(tournament_id, 0)
+    return len(teams_by_tournament.get(tournament_id, ()))
+
+def find_team_by_name(tournament_id, team_name):
+    """Return the id of the team with this name in a tournament, if any"""
+    return team_name_index.get((tournament_id, normalize_team_name(team_name)))
+
+def engine(bracket):
+    """Return the engine module that runs a bracket of any format"""
+    return FORMAT_ENGINES[bracket.get('format', 'single_elimination')]
+
+def team_name(team_id):
+    """Resolve a team id from a bracket to its current name"""
+    if team_id is None:
+        return "BYE"
+    team = teams.get(team_id) or archived_teams.get(team_id)
+    return team['name'] if team else "Unknown team"
+
+def iter_tournament_team_ids(tournament_id, active_only=False):
+    """Iterate over the team ids of a tournament in registration order"""
+    team_ids = teams_by_tournament.get(tournament_id, ())
+    if active_only:
+        return (team_id for team_id in team_ids if teams[team_id].get('status') == 'active')
+    return iter(team_ids)
+
+# Archived tournaments, loaded on demand for history views
+async def load_archived(tournament_id):
+    """Return the archived record of a tournament, keeping recently used ones loaded"""
+    record = archive_cache.get(tournament_id)
+    if record is None:
+        record = await asyncio.to_thread(archive.read, tournament_id)
+        if record is None:
+            return None
+        archive_cache[tournament_id] = record
+        for team in record['teams']:
+            archived_teams[team['id']] = team
+        while len(archive_cache) > ARCHIVE_CACHE_SIZE:
+            _, evicted = archive_cache.popitem(last=False)
+            for team in evicted['teams']:
+                archived_teams.pop(team['id'], None)
+    archive_cache.move_to_end(tournament_id)
+    return record
+
+async def find_tournament(tournament_id):
+    """Return a tournament from the working set or the archive, or None"""
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        record = await load_archived(tournament_id)
+        tournament = record['tournament'] if record else None
+    return tournament
+
+async def find_team(team_id):
+    """Return a team from the working set or the archive, or None"""
+    team = teams.get(team_id) or archived_teams.get(team_id)
+    if team is None:
+        tournament_id = await asyncio.to_thread(archive.tournament_of, team_id)
+        if tournament_id is not None and await load_archived(tournament_id):
+            team = archived_teams.get(team_id)
+    return team
+
+# Paginated menus
+def paginate(ids, total, page):
+    """Return the ids on one page of an ordered id iterable, the clamped page and the page count
+
+    Only the requested page is taken from `ids`, so a menu builds buttons for
+    at most MENU_PAGE_SIZE items however long the underlying index is.
+    """
+    pages = max(1, (total + MENU_PAGE_SIZE - 1) // MENU_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    start = page * MENU_PAGE_SIZE
+    return list(islice(ids, start, start + MENU_PAGE_SIZE)), page, pages
+
+def page_navigation(page_callback, page, pages):
+    """Return the prev/next row of a paginated keyboard, or None for a single page
+
+    page_callback(page) returns the callback data that opens that page.
+    """
+    if pages <= 1:
+        return None
+    return [
+        InlineKeyboardButton("◀️", callback_data=page_callback((page - 1) % pages)),
+        InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=encode_callback('noop')),
+        InlineKeyboardButton("▶️", callback_data=page_callback((page + 1) % pages))
+    ]
+
+def cached_view(view, tournament_id, page, render):
+    """Return the (text, reply_markup) of a menu, calling render() only if it changed"""
+    rendered = view_cache.get(view, tournament_id, page)
+    if rendered is None:
+        rendered = render()
+        view_cache.put(view, tournament_id, page, rendered)
+    return rendered
+
+def remember_roster_photos():
+    """Seed the downloader with the roster photos already stored"""
+    for team in teams.values():
+        for unique_id, filename in zip(team.get('roster_unique_ids', []), team.get('roster_photos', [])):
+            roster_downloader.remember(unique_id, filename)
+
+# Startup, in phases timed from STARTED_AT
+startup_phases = {}  # phase -> seconds, in the order the phases ran
+startup_mark = STARTED_AT
+time_to_first_response = None
+
+def mark_startup(phase):
+    """Record the time since the previous phase ended as the duration of `phase`"""
+    global startup_mark
+    now = time.perf_counter()
+    startup_phases[phase] = now - startup_mark
+    startup_mark = now
+    logger.info(f"Startup: {phase} took {startup_phases[phase] * 1000:.0f} ms ({(now - STARTED_AT) * 1000:.0f} ms since start)")
+
+def install_state(state):
+    """Fill the in-memory collections from freshly read state and index them"""
+    tournaments.update(state.get('tournaments', {}))
+    teams.update(state.get('teams', {}))
+    meta.update(state.get('meta', {}))
+    id_allocator.last = max(id_allocator.last, meta.get('ids', {}).get('last', 0))
+    if PERSIST_CONVERSATIONS:
+        user_states.load(state.get('user_states', {}))
+    outbox.load(state.get('outbox', {}))
+    rebuild_indexes()
+    migrate_brackets()
+    remember_roster_photos()
+
+async def load_state(application):
+    """Load state in the background while the listener already accepts updates"""
+    global render_cache
+    try:
+        state, source = await asyncio.to_thread(read_state)
+        mark_startup(f"load_{source}")
+        install_state(state)
+        # The loaded state lives as long as the process; keep it out of future collections
+        gc.freeze()
+        mark_startup('index')
+        render_cache = await asyncio.to_thread(
+            RenderCache, os.path.join(CACHE_DIR, 'sheets'), RENDER_CACHE_MB * 1024 * 1024
+        )
+        mark_startup('render_cache')
+    except Exception:
+        logger.exception("Could not load state")
+        application.stop_running()
+        return
+    state_ready.set()
+    logger.info(f"Ready with {len(tournaments)} tournaments and {len(teams)} teams")
+
+def save_warm_snapshot():
+    """Write the working set for the next cold start, after the store is closed"""
+    if not state_ready.is_set() or persistence.stats()['pending_records']:
+        warm_snapshot.discard()
+        return
+    started = time.perf_counter()
+    if warm_snapshot.save({name: dict(records) for name, records in collections.items()}):
+        logger.info(f"Wrote warm snapshot in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+async def wait_for_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Hold updates that arrive during startup until state is loaded"""
+    await state_ready.wait()
+
+async def record_first_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Record the time from process start to the first handled update"""
+    global time_to_first_response
+    if time_to_first_response is None:
+        time_to_first_response = time.perf_counter() - STARTED_AT
+        logger.info(f"Startup: first update handled {time_to_first_response * 1000:.0f} ms after start")
+
+WELCOME_TEXT = (
+    "🤖 Welcome to Brawl Stars Tournament Bot!\n\n"
+    "Join tournaments, view teams, and compete!"
+)
+
+def main_menu_markup(user_id):
+    """Build the main menu keyboard"""
     keyboard = [
-        [InlineKeyboardButton("🏆 Tournaments", callback_data="view_tournaments")],
-        [InlineKeyboardButton("👥 View Teams", callback_data="view_teams")],
+        [InlineKeyboardButton("🏆 Tournaments", callback_data=encode_callback('tournaments', page=0))],
+        [InlineKeyboardButton("👥 View Teams", callback_data=encode_callback('teams_list'))],
     ]
     
     if user_id in ADMINS:
-        keyboard.append([InlineKeyboardButton("🔧 Admin Panel", callback_data="admin_panel")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        keyboard.append([InlineKeyboardButton("🔧 Admin Panel", callback_data=encode_callback('admin_panel'))])
     
-    if update.message:
-        await update.message.reply_text(
-            "🤖 Welcome to Brawl Stars Tournament Bot!\n\n"
-            "Join tournaments, view teams, and compete!",
-            reply_markup=reply_markup
-        )
-    else:
-        await update.callback_query.edit_message_text(
-            "🤖 Welcome to Brawl Stars Tournament Bot!\n\n"
-            "Join tournaments, view teams, and compete!",
-            reply_markup=reply_markup
-        )
+    return InlineKeyboardMarkup(keyboard)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send welcome message with main menu"""
+    await update.message.reply_text(WELCOME_TEXT, reply_markup=main_menu_markup(update.effective_user.id))
+
+async def show_main_menu(query, context):
+    """Return to the main menu"""
+    await query.edit_message_text(WELCOME_TEXT, reply_markup=main_menu_markup(query.from_user.id))
+
+async def noop(query, context):
+    """Ignore buttons that only display information"""
+
+async def view_bracket(query, context, tournament_id):
+    """Send the bracket image or standings of a tournament"""
+    await send_bracket(context, query.message.chat_id, tournament_id)
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all button callbacks"""
+    """Decode a button callback and dispatch it through CALLBACK_ROUTES"""
     query = update.callback_query
-    await query.answer()
-    data = query.data
-    
-    handlers = {
-        "view_tournaments": show_tournaments,
-        "view_teams": show_teams_list,
-        "admin_panel": admin_panel,
-        "main_menu": start
-    }
+    try:
+        route, arguments = decode_callback(query.data)
+    except CallbackError:
+        await query.answer("This button is no longer valid. Please open the menu again.", show_alert=True)
+        return
     
-    if data in handlers:
-        await handlers[data](query, context)
-    elif data.startswith("tournament_"):
-        tournament_id = data.split("_")[1]
-        await join_tournament_start(query, context, tournament_id)
-    elif data.startswith("view_teams_"):
-        tournament_id = data.split("_")[2]
-        await show_tournament_teams(query, context, tournament_id)
-    elif data.startswith("team_details_"):
-        team_id = data.split("_")[2]
-        await show_team_details(query, context, team_id)
-    elif data.startswith("admin_delete_team_"):
-        tournament_id = data.split("_")[3]
-        await admin_delete_team_menu(query, context, tournament_id)
-    elif data.startswith("confirm_delete_team_"):
-        team_id = data.split("_")[3]
-        await admin_delete_team_confirm(query, context, team_id)
-    elif data.startswith("admin_delete_tournament_"):
-        tournament_id = data.split("_")[3]
-        await admin_delete_tournament_menu(query, context)
-    elif data.startswith("confirm_delete_tournament_"):
-        tournament_id = data.split("_")[3]
-        await admin_delete_tournament_confirm(query, context, tournament_id)
-    elif data.startswith("report_winner_"):
-        parts = data.split("_")
-        match_id = parts[2]
-        winner_team_id = parts[3]
-        await report_match_winner(query, context, match_id, winner_team_id)
-
-async def show_tournaments(query, context):
-    """Show available tournaments"""
-    active_tournaments = {k: v for k, v in tournaments.items() if v['status'] == 'active'}
+    await query.answer()
+    with callback_latency.time(route):
+        await CALLBACK_ROUTES[route](query, context, **arguments)
+
+def render_tournaments(page):
+    """Build one page of the available tournaments menu"""
+    active_ids = tournaments_by_status.get('active', {})
     
-    if not active_tournaments:
-        await query.edit_message_text("No active tournaments available. Check back later!")
-        return
+    if not active_ids:
+        return "No active tournaments available. Check back later!", None
     
+    page_ids, page, pages = paginate(active_ids, len(active_ids), page)
     keyboard = []
-    for tournament_id, tournament in active_tournaments.items():
-        teams_count = len([t for t in teams.values() if t.get('tournament_id') == tournament_id])
+    for tournament_id in page_ids:
+        tournament = tournaments[tournament_id]
+        teams_count = count_tournament_teams(tournament_id)
         button_text = f"{tournament['name']} ({teams_count}/{tournament['max_teams']})"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"tournament_{tournament_id}")])
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=encode_callback('join_tournament', tournament_id=tournament_id))])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text("🏆 Available Tournaments:", reply_markup=reply_markup)
+    navigation = page_navigation(lambda p: encode_callback('tournaments', page=p), page, pages)
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('main_menu'))])
+    return "🏆 Available Tournaments:", InlineKeyboardMarkup(keyboard)
+
+async def show_tournaments(query, context, page=0):
+    """Show one page of available tournaments"""
+    text, reply_markup = cached_view('tournaments', ALL_TOURNAMENTS, page, partial(render_tournaments, page))
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
 async def join_tournament_start(query, context, tournament_id):
     """Start team registration process"""
@@ -140,14 +623,15 @@ async def join_tournament_start(query, context, tournament_id):
         return
     
     tournament = tournaments[tournament_id]
-    teams_count = len([t for t in teams.values() if t.get('tournament_id') == tournament_id])
+    teams_count = count_tournament_teams(tournament_id)
     
     if teams_count >= tournament['max_teams']:
         await query.edit_message_text("❌ This tournament is full!")
         return
     
     user_id = query.from_user.id
-    user_states[user_id] = {'state': 'waiting_team_name', 'tournament_id': tournament_id}
+    async with user_locks.hold(user_id):
+        user_states.set(user_id, {'state': 'waiting_team_name', 'tournament_id': tournament_id})
     
     await query.edit_message_text(
         f"Joining: {tournament['name']}\n\n"
@@ -157,7 +641,8 @@ async def join_tournament_start(query, context, tournament_id):
 async def handle_team_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle team name input"""
     user_id = update.effective_user.id
-    if user_id not in user_states or user_states[user_id].get('state') != 'waiting_team_name':
+    user_data = user_states.get(user_id)
+    if not user_data or user_data.get('state') != 'waiting_team_name':
         return
     
     team_name = update.message.text.strip()
@@ -165,26 +650,26 @@ async def handle_team_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Please enter a valid team name:")
         return
     
-    tournament_id = user_states[user_id]['tournament_id']
+    tournament_id = user_data['tournament_id']
     
     # Check if team name already exists
-    existing_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id and t.get('name', '').lower() == team_name.lower()]
-    if existing_teams:
+    if find_team_by_name(tournament_id, team_name):
         await update.message.reply_text("❌ Team name already exists in this tournament. Please choose a different name:")
         return
     
-    user_states[user_id] = {
+    user_states.set(user_id, {
         'state': 'waiting_leader_username', 
         'tournament_id': tournament_id,
         'team_name': team_name
-    }
+    })
     
     await update.message.reply_text("👑 Please enter team leader's username (for contact, without @):")
 
 async def handle_leader_username(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle leader username input"""
     user_id = update.effective_user.id
-    if user_id not in user_states or user_states[user_id].get('state') != 'waiting_leader_username':
+    user_data = user_states.get(user_id)
+    if not user_data or user_data.get('state') != 'waiting_leader_username':
         return
     
     leader_username = update.message.text.strip().lstrip('@')
@@ -192,63 +677,138 @@ async def handle_leader_username(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("Please enter a valid username:")
         return
     
-    tournament_id = user_states[user_id]['tournament_id']
-    team_name = user_states[user_id]['team_name']
-    
-    user_states[user_id] = {
+    user_states.set(user_id, {
         'state': 'waiting_roster', 
-        'tournament_id': tournament_id,
-        'team_name': team_name,
+        'tournament_id': user_data['tournament_id'],
+        'team_name': user_data['team_name'],
         'leader_username': leader_username,
-        'roster_photos': []
-    }
+        'roster_file_ids': [],
+        'roster_unique_ids': []
+    })
     
-    await update.message.reply_text("📸 Please send 3 roster photos (send them one by one):")
+    await update.message.reply_text("📸 Please send 3 roster photos (one by one or as an album):")
 
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle roster photo uploads"""
     user_id = update.effective_user.id
-    if user_id not in user_states or user_states[user_id].get('state') != 'waiting_roster':
+    user_data = user_states.get(user_id)
+    if not user_data or user_data.get('state') != 'waiting_roster':
         return
     
     photo = update.message.photo[-1]
-    photo_file = await photo.get_file()
-    
-    # Save photo
-    photo_id = f"photo_{user_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-    photo_path = os.path.join(ROSTERS_DIR, photo_id)
-    await photo_file.download_to_drive(photo_path)
-    
-    user_states[user_id]['roster_photos'].append(photo_id)
+    media_group_id = update.message.media_group_id
+    if not media_group_id:
+        await add_roster_photos(update, context, user_id, [photo])
+        return
     
-    if len(user_states[user_id]['roster_photos']) >= 3:
-        await finish_team_registration(update, context, user_id)
-    else:
-        remaining = 3 - len(user_states[user_id]['roster_photos'])
-        await update.message.reply_text(f"✅ Photo received! Send {remaining} more photo(s).")
+    # Photos of an album arrive as separate updates; collect them first
+    album_key = (user_id, media_group_id)
+    if album_key in pending_albums:
+        pending_albums[album_key][1].append(photo)
+        return
+    pending_albums[album_key] = (update, [photo])
+    context.application.create_task(finish_album(context, album_key))
+
+async def finish_album(context, album_key):
+    """Add an album to the roster once all of its photos had time to arrive"""
+    await asyncio.sleep(ALBUM_COLLECT_SECONDS)
+    first_update, photos = pending_albums.pop(album_key)
+    await add_roster_photos(first_update, context, album_key[0], photos)
+
+async def add_roster_photos(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, photos):
+    """Add received photos to a roster and queue their downloads"""
+    async with user_locks.hold(user_id):
+        user_data = user_states.get(user_id)
+        if not user_data or user_data.get('state') != 'waiting_roster':
+            return
+        
+        for photo in photos[:3 - len(user_data['roster_file_ids'])]:
+            user_data['roster_file_ids'].append(photo.file_id)
+            user_data['roster_unique_ids'].append(photo.file_unique_id)
+            roster_downloader.request(context.bot, photo.file_id, photo.file_unique_id)
+        user_states.touch(user_id)
+        
+        if len(user_data['roster_file_ids']) >= 3:
+            await finish_team_registration(update, context, user_id)
+        else:
+            remaining = 3 - len(user_data['roster_file_ids'])
+            await update.message.reply_text(f"✅ Photo received! Send {remaining} more photo(s).")
+
+def attach_roster_photo(team_id, index, future):
+    """Store the filename of a roster photo once its download finishes"""
+    filename = future.result()
+    team = teams.get(team_id)
+    if filename and team and team['roster_photos'][index] is None:
+        team['roster_photos'][index] = filename
+        mark_dirty('teams', team_id)
 
 async def finish_team_registration(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Complete team registration"""
-    user_data = user_states[user_id]
+    user_data = user_states.pop(user_id)
     tournament_id = user_data['tournament_id']
     
-    # Create team
-    team_id = f"team_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    teams[team_id] = {
+    # Capacity and name were checked earlier in the conversation, but other
+    # registrations may have finished since; check again under the lock
+    async with tournament_locks.hold(tournament_id):
+        tournament = tournaments.get(tournament_id)
+        if tournament is None or tournament['status'] != 'active':
+            error = "❌ This tournament is no longer open for registration!"
+        elif count_tournament_teams(tournament_id) >= tournament['max_teams']:
+            error = "❌ This tournament is full!"
+        elif find_team_by_name(tournament_id, user_data['team_name']):
+            error = "❌ Another team registered this name in the meantime. Please join again with a different name."
+        else:
+            error = None
+            register_team(context, user_id, user_data)
+    
+    if error:
+        await update.message.reply_text(error)
+        return
+    
+    keyboard = [
+        [InlineKeyboardButton("🏆 View Tournaments", callback_data=encode_callback('tournaments', page=0))],
+        [InlineKeyboardButton("👥 View Teams", callback_data=encode_callback('teams_list'))],
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await update.message.reply_text(
+        "✅ Team registered successfully!\n\n"
+        f"Team: {user_data['team_name']}\n"
+        f"Leader: @{user_data['leader_username']}\n\n"
+        "Good luck in the tournament! 🎮",
+        reply_markup=reply_markup
+    )
+
+def register_team(context, user_id, user_data):
+    """Create a team from a finished registration; the caller holds the tournament lock"""
+    tournament_id = user_data['tournament_id']
+    
+    # Create team; photos still downloading are filled in when they finish
+    team_id = id_allocator.allocate('tm')
+    downloads = [
+        roster_downloader.request(context.bot, file_id, unique_id)
+        for file_id, unique_id in zip(user_data['roster_file_ids'], user_data['roster_unique_ids'])
+    ]
+    add_team({
         'id': team_id,
         'name': user_data['team_name'],
         'leader_username': user_data['leader_username'],
         'tournament_id': tournament_id,
-        'roster_photos': user_data['roster_photos'],
+        'roster_photos': [d.result() if d.done() else None for d in downloads],
+        'roster_file_ids': user_data['roster_file_ids'],
+        'roster_unique_ids': user_data['roster_unique_ids'],
         'registered_by': user_id,
         'status': 'active'
-    }
+    })
+    for index, download in enumerate(downloads):
+        if not download.done():
+            download.add_done_callback(partial(attach_roster_photo, team_id, index))
     
-    save_data(teams, TEAMS_FILE)
+    mark_dirty('teams', team_id)
     
     # Notify admins
     tournament = tournaments[tournament_id]
-    teams_count = len([t for t in teams.values() if t.get('tournament_id') == tournament_id])
+    teams_count = count_tournament_teams(tournament_id)
     
     admin_text = (
         f"🆕 New team registered!\n"
@@ -258,77 +818,81 @@ async def finish_team_registration(update: Update, context: ContextTypes.DEFAULT
         f"Total teams: {teams_count}/{tournament['max_teams']}"
     )
     
-    await notify_admins(context, admin_text)
-    await send_teams_list_to_admins(context, tournament_id)
+    notify_admins(context, admin_text, key=f"registered:{team_id}")
+    send_teams_list_to_admins(context, tournament_id, key=f"teams:{team_id}")
     
     # Check if tournament is full
     if teams_count >= tournament['max_teams']:
-        tournaments[tournament_id]['status'] = 'full'
-        save_data(tournaments, TOURNAMENTS_FILE)
-        await notify_admins(context, f"🎯 Tournament {tournament['name']} is now FULL!")
-    
-    del user_states[user_id]
-    
-    keyboard = [
-        [InlineKeyboardButton("🏆 View Tournaments", callback_data="view_tournaments")],
-        [InlineKeyboardButton("👥 View Teams", callback_data="view_teams")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "✅ Team registered successfully!\n\n"
-        f"Team: {user_data['team_name']}\n"
-        f"Leader: @{user_data['leader_username']}\n\n"
-        "Good luck in the tournament! 🎮",
-        reply_markup=reply_markup
-    )
+        set_tournament_status(tournament_id, 'full')
+        mark_dirty('tournaments', tournament_id)
+        notify_admins(context, f"🎯 Tournament {tournament['name']} is now FULL!", key=f"full:{team_id}")
 
-async def show_teams_list(query, context):
-    """Show list of tournaments with teams"""
+def render_teams_list():
+    """Build the menu of tournaments that have teams"""
     active_tournaments = {k: v for k, v in tournaments.items() if v['status'] in ['active', 'full', 'started']}
     
     if not active_tournaments:
-        await query.edit_message_text("No tournaments with teams available.")
-        return
+        return "No tournaments with teams available.", None
     
     keyboard = []
     for tournament_id, tournament in active_tournaments.items():
-        tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id]
-        if tournament_teams:
-            button_text = f"{tournament['name']} ({len(tournament_teams)} teams)"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"view_teams_{tournament_id}")])
+        teams_count = count_tournament_teams(tournament_id)
+        if teams_count:
+            button_text = f"{tournament['name']} ({teams_count} teams)"
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=encode_callback('tournament_teams', page=0, tournament_id=tournament_id))])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text("Select tournament to view teams:", reply_markup=reply_markup)
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('main_menu'))])
+    return "Select tournament to view teams:", InlineKeyboardMarkup(keyboard)
+
+async def show_teams_list(query, context):
+    """Show list of tournaments with teams"""
+    text, reply_markup = cached_view('teams_list', ALL_TOURNAMENTS, 0, render_teams_list)
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
-async def show_tournament_teams(query, context, tournament_id):
-    """Show teams for a specific tournament"""
-    tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id and t.get('status') == 'active']
+def render_tournament_teams(tournament_id, page):
+    """Build one page of the teams menu of a tournament"""
+    teams_count = count_tournament_teams(tournament_id, active_only=True)
     
-    if not tournament_teams:
-        await query.edit_message_text("No teams registered for this tournament yet.")
-        return
+    if not teams_count:
+        return "No teams registered for this tournament yet.", None
     
+    page_ids, page, pages = paginate(iter_tournament_team_ids(tournament_id, active_only=True), teams_count, page)
     keyboard = []
-    for team in tournament_teams:
+    for team_id in page_ids:
+        team = teams[team_id]
         keyboard.append([InlineKeyboardButton(
             f"{team['name']} (@{team['leader_username']})", 
-            callback_data=f"team_details_{team['id']}"
+            callback_data=encode_callback('team_details', team_id=team_id)
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="view_teams")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(f"Teams in {tournaments[tournament_id]['name']}:", reply_markup=reply_markup)
+    navigation = page_navigation(
+        lambda p: encode_callback('tournament_teams', page=p, tournament_id=tournament_id), page, pages
+    )
+    if navigation:
+        keyboard.append(navigation)
+    bracket = tournaments[tournament_id].get('bracket')
+    if bracket:
+        label = "🎯 View Bracket" if bracket.get('format', 'single_elimination') == 'single_elimination' else "📊 Standings"
+        keyboard.append([InlineKeyboardButton(label, callback_data=encode_callback('view_bracket', tournament_id=tournament_id))])
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('teams_list'))])
+    return f"Teams in {tournaments[tournament_id]['name']}:", InlineKeyboardMarkup(keyboard)
+
+async def show_tournament_teams(query, context, tournament_id, page=0):
+    """Show one page of teams for a specific tournament"""
+    text, reply_markup = cached_view(
+        'tournament_teams', tournament_id, page, partial(render_tournament_teams, tournament_id, page)
+    )
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
 async def show_team_details(query, context, team_id):
     """Show team details and roster"""
-    if team_id not in teams:
+    # Teams of archived tournaments are loaded from the archive
+    team = await find_team(team_id)
+    if not team:
         await query.edit_message_text("❌ Team not found!")
         return
     
-    team = teams[team_id]
-    tournament = tournaments.get(team['tournament_id'], {})
+    tournament = await find_tournament(team['tournament_id']) or {}
     
     text = (
         f"🏆 {team['name']}\n"
@@ -338,22 +902,100 @@ async def show_team_details(query, context, team_id):
     )
     
     await query.edit_message_text(text)
+    if not await send_roster_sheet(context, query.message.chat_id, team):
+        await send_roster(context, query.message.chat_id, team)
+
+def save_team(team):
+    """Persist a team; archived teams are read-only and only change in memory"""
+    if team['id'] in teams:
+        mark_dirty('teams', team['id'])
+
+def get_render_pool():
+    """Return the process pool for image rendering, starting it on first use"""
+    global render_pool
+    if render_pool is None:
+        render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return render_pool
+
+async def render_image(func, *args):
+    """Run a CPU-heavy render function in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_render_pool(), func, *args)
+
+def roster_sheet_key(team):
+    """Return the cache key of a team's contact sheet"""
+    # Roster filenames are content hashes, so they identify the images
+    content = '\0'.join([team['name']] + team['roster_photos'])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+async def send_roster_sheet(context, chat_id, team):
+    """Send a team's roster as one contact sheet; returns False if it cannot be rendered"""
+    photo_names = team.get('roster_photos', [])
+    if not photo_names or not all(photo_names):
+        return False
+    
+    key = roster_sheet_key(team)
+    caption = f"{team['name']} Roster"
+    sheet = team.get('roster_sheet')
+    if sheet and sheet['key'] == key:
+        await context.bot.send_photo(chat_id=chat_id, photo=sheet['file_id'], caption=caption)
+        return True
     
-    # Send roster photos
-    for photo_name in team.get('roster_photos', []):
-        photo_path = os.path.join(ROSTERS_DIR, photo_name)
+    data = await asyncio.to_thread(render_cache.get, key)
+    if data is None:
+        photo_paths = [os.path.join(ROSTERS_DIR, name) for name in photo_names]
         try:
-            with open(photo_path, 'rb') as photo:
-                await context.bot.send_photo(
-                    chat_id=query.message.chat_id,
-                    photo=InputFile(photo),
-                    caption=f"{team['name']} Roster"
-                )
+            data = await render_image(render_contact_sheet, photo_paths, team['name'])
+        except Exception as e:
+            logger.error(f"Failed to render roster sheet for {team['id']}: {e}")
+            return False
+        await asyncio.to_thread(render_cache.put, key, data)
+    
+    message = await context.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+    team['roster_sheet'] = {'key': key, 'file_id': message.photo[-1].file_id}
+    save_team(team)
+    return True
+
+async def send_roster(context, chat_id, team):
+    """Send a team's roster photos as one album, reusing Telegram file_ids"""
+    photo_names = team.get('roster_photos', [])
+    file_ids = list(team.get('roster_file_ids') or [None] * len(photo_names))
+    
+    # Photos without a known file_id are uploaded from disk once
+    sources = []
+    uploads = []  # (position in album, position in roster) of uploaded photos
+    missing = 0
+    for index, photo_name in enumerate(photo_names):
+        if file_ids[index]:
+            sources.append(file_ids[index])
+            continue
+        if not photo_name:
+            missing += 1
+            continue
+        try:
+            with open(os.path.join(ROSTERS_DIR, photo_name), 'rb') as photo:
+                sources.append(photo.read())
+            uploads.append((len(sources) - 1, index))
         except FileNotFoundError:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="❌ Roster photo not available"
-            )
+            missing += 1
+    
+    if missing:
+        await context.bot.send_message(chat_id=chat_id, text="❌ Roster photo not available")
+    if not sources:
+        return
+    
+    caption = f"{team['name']} Roster"
+    if len(sources) == 1:
+        messages = [await context.bot.send_photo(chat_id=chat_id, photo=sources[0], caption=caption)]
+    else:
+        media = [InputMediaPhoto(source, caption=caption if i == 0 else None) for i, source in enumerate(sources)]
+        messages = await context.bot.send_media_group(chat_id=chat_id, media=media)
+    
+    if uploads:
+        for album_index, roster_index in uploads:
+            file_ids[roster_index] = messages[album_index].photo[-1].file_id
+        team['roster_file_ids'] = file_ids
+        save_team(team)
 
 # Admin functions
 async def admin_panel(query, context):
@@ -363,14 +1005,28 @@ async def admin_panel(query, context):
         return
     
     keyboard = [
-        [InlineKeyboardButton("➕ Create Tournament", callback_data="create_tournament_dialog")],
-        [InlineKeyboardButton("🗑️ Delete Tournament", callback_data="admin_delete_tournament_menu")],
-        [InlineKeyboardButton("👥 Manage Teams", callback_data="admin_manage_teams")],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")],
+        [InlineKeyboardButton("➕ Create Tournament", callback_data=encode_callback('create_tournament_help'))],
+        [InlineKeyboardButton("🗑️ Delete Tournament", callback_data=encode_callback('admin_delete_tournament_menu', page=0))],
+        [InlineKeyboardButton("👥 Manage Teams", callback_data=encode_callback('admin_manage_teams'))],
+        [InlineKeyboardButton("🔙 Back", callback_data=encode_callback('main_menu'))],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("🔧 Admin Panel", reply_markup=reply_markup)
 
+async def create_tournament_help(query, context):
+    """Explain how to create a tournament"""
+    if query.from_user.id not in ADMINS:
+        await query.edit_message_text("❌ Admin access required!")
+        return
+    
+    keyboard = [[InlineKeyboardButton("🔙 Back", callback_data=encode_callback('admin_panel'))]]
+    await query.edit_message_text(
+        "➕ To create a tournament, send:\n"
+        "/create <name> <max_teams> [format] [description]\n"
+        "Formats: elimination (default), swiss, roundrobin",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
 async def admin_manage_teams(query, context):
     """Show tournaments for team management"""
     if query.from_user.id not in ADMINS:
@@ -385,34 +1041,40 @@ async def admin_manage_teams(query, context):
     
     keyboard = []
     for tournament_id, tournament in active_tournaments.items():
-        tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id]
-        button_text = f"{tournament['name']} ({len(tournament_teams)} teams)"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_delete_team_{tournament_id}")])
+        button_text = f"{tournament['name']} ({count_tournament_teams(tournament_id)} teams)"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=encode_callback('admin_delete_team_menu', page=0, tournament_id=tournament_id))])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="admin_panel")])
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('admin_panel'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Select tournament to manage teams:", reply_markup=reply_markup)
 
-async def admin_delete_team_menu(query, context, tournament_id):
-    """Show teams for deletion"""
+async def admin_delete_team_menu(query, context, tournament_id, page=0):
+    """Show one page of teams for deletion"""
     if query.from_user.id not in ADMINS:
         await query.edit_message_text("❌ Admin access required!")
         return
     
-    tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id and t.get('status') == 'active']
+    teams_count = count_tournament_teams(tournament_id, active_only=True)
     
-    if not tournament_teams:
+    if not teams_count:
         await query.edit_message_text("No teams to delete.")
         return
     
+    page_ids, page, pages = paginate(iter_tournament_team_ids(tournament_id, active_only=True), teams_count, page)
     keyboard = []
-    for team in tournament_teams:
+    for team_id in page_ids:
+        team = teams[team_id]
         keyboard.append([InlineKeyboardButton(
             f"❌ {team['name']} (@{team['leader_username']})", 
-            callback_data=f"confirm_delete_team_{team['id']}"
+            callback_data=encode_callback('admin_delete_team', team_id=team_id)
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="admin_manage_teams")])
+    navigation = page_navigation(
+        lambda p: encode_callback('admin_delete_team_menu', page=p, tournament_id=tournament_id), page, pages
+    )
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('admin_manage_teams'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Select team to delete:", reply_markup=reply_markup)
 
@@ -422,16 +1084,23 @@ async def admin_delete_team_confirm(query, context, team_id):
         await query.edit_message_text("❌ Admin access required!")
         return
     
-    if team_id in teams:
-        team_name = teams[team_id]['name']
-        del teams[team_id]
-        save_data(teams, TEAMS_FILE)
-        await query.edit_message_text(f"✅ Team '{team_name}' deleted successfully!")
+    if team_id not in teams:
+        await query.edit_message_text("❌ Team not found!")
+        return
+    
+    async with tournament_locks.hold(teams[team_id]['tournament_id']):
+        team = remove_team(team_id)
+        if team is not None:
+            mark_dirty('teams', team_id)
+            await flush_now()
+    
+    if team is not None:
+        await query.edit_message_text(f"✅ Team '{team['name']}' deleted successfully!")
     else:
         await query.edit_message_text("❌ Team not found!")
 
-async def admin_delete_tournament_menu(query, context):
-    """Show tournaments for deletion"""
+async def admin_delete_tournament_menu(query, context, page=0):
+    """Show one page of tournaments for deletion"""
     if query.from_user.id not in ADMINS:
         await query.edit_message_text("❌ Admin access required!")
         return
@@ -440,14 +1109,18 @@ async def admin_delete_tournament_menu(query, context):
         await query.edit_message_text("No tournaments to delete.")
         return
     
+    page_ids, page, pages = paginate(tournaments, len(tournaments), page)
     keyboard = []
-    for tournament_id, tournament in tournaments.items():
+    for tournament_id in page_ids:
         keyboard.append([InlineKeyboardButton(
-            f"❌ {tournament['name']}", 
-            callback_data=f"confirm_delete_tournament_{tournament_id}"
+            f"❌ {tournaments[tournament_id]['name']}", 
+            callback_data=encode_callback('admin_delete_tournament', tournament_id=tournament_id)
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="admin_panel")])
+    navigation = page_navigation(lambda p: encode_callback('admin_delete_tournament_menu', page=p), page, pages)
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=encode_callback('admin_panel'))])
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Select tournament to delete:", reply_markup=reply_markup)
 
@@ -457,51 +1130,64 @@ async def admin_delete_tournament_confirm(query, context, tournament_id):
         await query.edit_message_text("❌ Admin access required!")
         return
     
-    if tournament_id in tournaments:
-        tournament_name = tournaments[tournament_id]['name']
-        
-        # Remove teams from this tournament
-        teams_to_delete = [team_id for team_id, team in teams.items() if team.get('tournament_id') == tournament_id]
-        for team_id in teams_to_delete:
-            del teams[team_id]
-        
-        del tournaments[tournament_id]
-        save_data(tournaments, TOURNAMENTS_FILE)
-        save_data(teams, TEAMS_FILE)
-        
-        await query.edit_message_text(f"✅ Tournament '{tournament_name}' deleted successfully!")
+    async with tournament_locks.hold(tournament_id):
+        tournament = remove_tournament(tournament_id)
+        if tournament is not None:
+            # Remove teams from this tournament
+            for team_id in list(teams_by_tournament.get(tournament_id, ())):
+                remove_team(team_id)
+                mark_dirty('teams', team_id)
+            
+            mark_dirty('tournaments', tournament_id)
+            await flush_now()
+            # Roster photos are shared by content, so they are left to the
+            # tiering pass, which deletes the ones no team uses any more
+    
+    if tournament is not None:
+        await query.edit_message_text(f"✅ Tournament '{tournament['name']}' deleted successfully!")
     else:
         await query.edit_message_text("❌ Tournament not found!")
 
-async def notify_admins(context, message):
-    """Send notification to all admins"""
+def notify_admins(context, message, reply_markup=None, key=None):
+    """Queue a notification to all admins in the outbox
+
+    `key` names the event being announced; an event whose notification was
+    already queued is not announced again.
+    """
+    key = key or outbox.new_key()
     for admin_id in ADMINS:
-        try:
-            await context.bot.send_message(admin_id, message)
-        except Exception as e:
-            logger.error(f"Failed to notify admin {admin_id}: {e}")
+        outbox.enqueue(f"{key}:{admin_id}", admin_id, bot=context.bot, text=message, reply_markup=reply_markup)
 
-async def send_teams_list_to_admins(context, tournament_id):
-    """Send teams list to admins"""
-    tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id and t.get('status') == 'active']
+def render_admin_teams_list(tournament_id):
+    """Build the full team list of a tournament sent to admins"""
+    tournament_teams = get_tournament_teams(tournament_id, active_only=True)
     tournament = tournaments[tournament_id]
     
-    text = f"👥 Teams in {tournament['name']}:\n\n"
+    lines = [f"👥 Teams in {tournament['name']}:", ""]
     for i, team in enumerate(tournament_teams, 1):
-        text += f"{i}. {team['name']} (@{team['leader_username']})\n"
+        lines.append(f"{i}. {team['name']} (@{team['leader_username']})")
     
-    text += f"\nTotal: {len(tournament_teams)}/{tournament['max_teams']}"
-    await notify_admins(context, text)
+    lines.append("")
+    lines.append(f"Total: {len(tournament_teams)}/{tournament['max_teams']}")
+    return '\n'.join(lines), None
+
+def send_teams_list_to_admins(context, tournament_id, key=None):
+    """Send teams list to admins"""
+    text, _ = cached_view('admin_teams', tournament_id, 0, partial(render_admin_teams_list, tournament_id))
+    notify_admins(context, text, key=key)
 
 # Command handlers
 async def create_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Create a new tournament - /create <name> <max_teams> <description>"""
+    """Create a new tournament - /create <name> <max_teams> [format] [description]"""
     if update.effective_user.id not in ADMINS:
         await update.message.reply_text("❌ Admin access required!")
         return
     
-    if len(context.args) < 3:
-        await update.message.reply_text("Usage: /create <name> <max_teams> <description>")
+    if len(context.args) < 2:
+        await update.message.reply_text(
+            "Usage: /create <name> <max_teams> [format] [description]\n"
+            "Formats: elimination (default), swiss, roundrobin"
+        )
         return
     
     name = context.args[0]
@@ -511,235 +1197,866 @@ async def create_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Max teams must be a number!")
         return
     
-    description = ' '.join(context.args[2:])
+    tournament_format = 'single_elimination'
+    description_args = context.args[2:]
+    if description_args and description_args[0].lower() in FORMAT_ALIASES:
+        tournament_format = FORMAT_ALIASES[description_args[0].lower()]
+        description_args = description_args[1:]
+    description = ' '.join(description_args)
     
-    tournament_id = f"tournament_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    tournaments[tournament_id] = {
+    tournament_id = id_allocator.allocate('tr')
+    add_tournament(tournament_id, {
         'id': tournament_id,
         'name': name,
         'max_teams': max_teams,
         'description': description,
+        'format': tournament_format,
         'status': 'active',
         'created_at': datetime.now().isoformat()
-    }
+    })
     
-    if save_data(tournaments, TOURNAMENTS_FILE):
+    mark_dirty('tournaments', tournament_id)
+    if await flush_now():
         await update.message.reply_text(
             f"✅ Tournament created!\n"
             f"Name: {name}\n"
             f"Max teams: {max_teams}\n"
-            f"Description: {description}\n\n"
+            f"Format: {FORMAT_NAMES[tournament_format]}\n"
+            f"Description: {description or '-'}\n\n"
             f"ID: {tournament_id}"
         )
     else:
         await update.message.reply_text("❌ Failed to create tournament!")
 
-async def generate_bracket(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Generate tournament bracket - /generate_bracket <tournament_id>"""
+# Bulk import and export, see bulk.py for the file format
+def plan_import(rows):
+    """Validate import rows against the current state without changing it
+
+    Returns (new tournaments, new teams, errors). A team's `tournament_id` is
+    an existing id or ('new', index into the new tournaments).
+    """
+    new_tournaments = []
+    new_tournament_names = {}  # name -> index into new_tournaments
+    new_teams = []
+    added = {}  # tournament key -> teams added by this import
+    names = set()  # (tournament key, normalized name) of teams added by this import
+    errors = []
+    
+    for number, row in rows:
+        row_type = field(row, 'type').lower()
+        if row_type in RESULT_TYPES:
+            continue
+        if row_type == 'tournament':
+            name = field(row, 'name')
+            tournament_format = FORMAT_ALIASES.get(field(row, 'format').lower() or 'elimination')
+            try:
+                max_teams = int(field(row, 'max_teams'))
+            except ValueError:
+                max_teams = None
+            if not name:
+                errors.append(f"Line {number}: tournament name is missing")
+            elif name in new_tournament_names:
+                errors.append(f"Line {number}: tournament {name} appears twice")
+            elif max_teams is None or max_teams < 2:
+                errors.append(f"Line {number}: max_teams must be a number of at least 2")
+            elif tournament_format is None:
+                errors.append(f"Line {number}: unknown format {field(row, 'format')}")
+            else:
+                new_tournament_names[name] = len(new_tournaments)
+                new_tournaments.append({
+                    'name': name,
+                    'max_teams': max_teams,
+                    'description': field(row, 'description'),
+                    'format': tournament_format,
+                })
+        elif row_type == 'team':
+            name = field(row, 'name')
+            leader_username = field(row, 'leader_username').lstrip('@')
+            reference = field(row, 'tournament')
+            if reference in tournaments:
+                key = reference
+                tournament = tournaments[reference]
+                existing = count_tournament_teams(reference)
+            elif reference in new_tournament_names:
+                key = ('new', new_tournament_names[reference])
+                tournament = new_tournaments[key[1]]
+                existing = 0
+            else:
+                errors.append(f"Line {number}: unknown tournament {reference or '(empty)'}")
+                continue
+            name_key = (key, normalize_team_name(name))
+            if not name or not leader_username:
+                errors.append(f"Line {number}: team name and leader_username are required")
+            elif isinstance(key, str) and tournament['status'] != 'active':
+                errors.append(f"Line {number}: tournament {tournament['name']} is not open for registration")
+            elif name_key in names or (isinstance(key, str) and find_team_by_name(key, name)):
+                errors.append(f"Line {number}: team {name} already exists in {tournament['name']}")
+            elif existing + added.get(key, 0) >= tournament['max_teams']:
+                errors.append(f"Line {number}: tournament {tournament['name']} is full")
+            else:
+                names.add(name_key)
+                added[key] = added.get(key, 0) + 1
+                new_teams.append({'name': name, 'leader_username': leader_username, 'tournament_id': key})
+        else:
+            errors.append(f"Line {number}: unknown row type {row_type or '(empty)'}")
+    
+    return new_tournaments, new_teams, errors
+
+async def import_rows(rows, user_id):
+    """Validate and apply import rows as one transaction with a single write
+
+    Nothing changes unless every row is valid. Returns (tournament ids
+    created, teams created, errors, saved).
+    """
+    # Lock every existing tournament the file adds teams to, in a fixed order
+    referenced = sorted({
+        field(row, 'tournament') for _, row in rows
+        if field(row, 'type').lower() == 'team' and field(row, 'tournament') in tournaments
+    })
+    async with AsyncExitStack() as stack:
+        for tournament_id in referenced:
+            await stack.enter_async_context(tournament_locks.hold(tournament_id))
+        
+        new_tournaments, new_teams, errors = plan_import(rows)
+        if errors or not (new_tournaments or new_teams):
+            return [], 0, errors, True
+        
+        created = []
+        for tournament in new_tournaments:
+            tournament_id = id_allocator.allocate('tr')
+            add_tournament(tournament_id, {
+                'id': tournament_id,
+                **tournament,
+                'status': 'active',
+                'created_at': datetime.now().isoformat()
+            })
+            mark_dirty('tournaments', tournament_id)
+            created.append(tournament_id)
+        
+        touched = {}
+        for team in new_teams:
+            tournament_id = team['tournament_id']
+            if isinstance(tournament_id, tuple):
+                tournament_id = created[tournament_id[1]]
+            team_id = id_allocator.allocate('tm')
+            add_team({
+                'id': team_id,
+                'name': team['name'],
+                'leader_username': team['leader_username'],
+                'tournament_id': tournament_id,
+                'roster_photos': [],
+                'roster_file_ids': [],
+                'roster_unique_ids': [],
+                'registered_by': user_id,
+                'status': 'active'
+            })
+            mark_dirty('teams', team_id)
+            touched[tournament_id] = None
+        
+        for tournament_id in touched:
+            tournament = tournaments[tournament_id]
+            if count_tournament_teams(tournament_id) >= tournament['max_teams']:
+                set_tournament_status(tournament_id, 'full')
+                mark_dirty('tournaments', tournament_id)
+        
+        saved = await flush_now()
+    return created, len(new_teams), [], saved
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import tournaments and teams from a CSV or JSON Lines document - /import"""
     if update.effective_user.id not in ADMINS:
         await update.message.reply_text("❌ Admin access required!")
         return
     
-    if not context.args:
-        await update.message.reply_text("Usage: /generate_bracket <tournament_id>")
+    message = update.message
+    document = message.document or (message.reply_to_message and message.reply_to_message.document)
+    if document is None:
+        await update.message.reply_text(
+            "Send a CSV or JSON Lines file with the caption /import, or reply /import to one.\n"
+            "Rows: type=tournament (name, max_teams, format, description) or "
+            "type=team (tournament, name, leader_username)."
+        )
         return
-    
-    tournament_id = context.args[0]
-    if tournament_id not in tournaments:
-        await update.message.reply_text("❌ Tournament not found!")
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"❌ The file is larger than {IMPORT_MAX_BYTES // 1024} KiB!")
         return
     
-    tournament_teams = [t for t in teams.values() if t.get('tournament_id') == tournament_id and t.get('status') == 'active']
-    
-    if len(tournament_teams) < 2:
-        await update.message.reply_text("❌ Need at least 2 teams to generate bracket!")
+    file = await context.bot.get_file(document.file_id)
+    data = await file.download_as_bytearray()
+    try:
+        rows = await asyncio.to_thread(lambda: list(islice(read_rows(data, document.file_name or ''), IMPORT_MAX_ROWS + 1)))
+    except BulkError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    if len(rows) > IMPORT_MAX_ROWS:
+        await update.message.reply_text(f"❌ The file has more than {IMPORT_MAX_ROWS} rows!")
         return
     
-    # Simple bracket generation
-    random.shuffle(tournament_teams)
-    matches = []
-    
-    for i in range(0, len(tournament_teams), 2):
-        if i + 1 < len(tournament_teams):
-            match_id = f"match_{tournament_id}_{len(matches)}"
-            matches.append({
-                'id': match_id,
-                'team1': tournament_teams[i],
-                'team2': tournament_teams[i + 1],
-                'winner': None,
-                'round': 1
-            })
+    created, team_count, errors, saved = await import_rows(rows, update.effective_user.id)
+    if errors:
+        shown = '\n'.join(errors[:IMPORT_ERRORS_SHOWN])
+        more = f"\n…and {len(errors) - IMPORT_ERRORS_SHOWN} more" if len(errors) > IMPORT_ERRORS_SHOWN else ""
+        await update.message.reply_text(f"❌ Nothing was imported, the file has errors:\n{shown}{more}")
+        return
+    if not created and not team_count:
+        await update.message.reply_text("The file has no tournaments or teams to import.")
+        return
+    if not saved:
+        await update.message.reply_text("❌ Failed to save the import!")
+        return
     
-    tournaments[tournament_id]['bracket'] = {
-        'matches': matches,
-        'current_round': 1,
-        'status': 'active'
+    summary = f"📥 Imported {len(created)} tournaments and {team_count} teams"
+    ids = '\n'.join(f"{tournaments[t]['name']}: {t}" for t in created[:IMPORT_ERRORS_SHOWN])
+    await update.message.reply_text(f"✅ {summary}" + (f"\n\n{ids}" if ids else ""))
+    notify_admins(context, summary)
+
+def export_rows(tournament, tournament_teams):
+    """Yield the export rows of a tournament: itself, its teams, then its results"""
+    name = tournament['name']
+    yield {
+        'type': 'tournament',
+        'name': name,
+        'max_teams': tournament['max_teams'],
+        'format': tournament.get('format', 'single_elimination'),
+        'description': tournament.get('description', ''),
     }
-    tournaments[tournament_id]['status'] = 'started'
+    for team in tournament_teams:
+        yield {'type': 'team', 'tournament': name, 'name': team['name'], 'leader_username': team['leader_username']}
     
-    if save_data(tournaments, TOURNAMENTS_FILE):
-        await update.message.reply_text(f"✅ Bracket generated for {tournaments[tournament_id]['name']}!")
-        await send_bracket_to_admins(context, tournament_id)
+    bracket = tournament.get('bracket')
+    if not bracket:
+        return
+    bracket_engine = engine(bracket)
+    if bracket_engine is league:
+        for team_id, wins, losses in league.standings(bracket):
+            yield {'type': 'standing', 'tournament': name, 'name': team_name(team_id), 'wins': wins, 'losses': losses}
+        # Leagues keep only the current and the previous round
+        round_numbers = [bracket['previous']['round']] if bracket['previous'] else []
+        round_numbers.append(bracket['current_round'])
     else:
-        await update.message.reply_text("❌ Failed to generate bracket!")
+        round_numbers = range(1, bracket['current_round'] + 1)
+    for round_number in round_numbers:
+        for match in bracket_engine.round_matches(bracket, round_number):
+            if match['team1'] is None:
+                continue
+            yield {
+                'type': 'match',
+                'tournament': name,
+                'round': round_number,
+                'team1': team_name(match['team1']),
+                'team2': team_name(match['team2']),
+                'winner': team_name(match['winner']) if match['winner'] else '',
+            }
 
-async def send_bracket_to_admins(context, tournament_id):
-    """Send bracket to admins"""
-    tournament = tournaments[tournament_id]
-    bracket = tournament['bracket']
+async def export_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send a tournament's teams and results as a document - /export <tournament_id> [csv|jsonl]"""
+    if update.effective_user.id not in ADMINS:
+        await update.message.reply_text("❌ Admin access required!")
+        return
     
-    text = f"🎯 Bracket for {tournament['name']} - Round 1:\n\n"
+    if not context.args or (len(context.args) > 1 and context.args[1].lower() not in EXPORT_FORMATS):
+        await update.message.reply_text("Usage: /export <tournament_id> [csv|jsonl]")
+        return
     
-    for match in bracket['matches']:
-        team2_name = match['team2']['name'] if match['team2'] else "BYE"
-        text += f"⚔️ {match['team1']['name']} vs {team2_name}\n"
+    tournament_id = context.args[0]
+    export_format = context.args[1].lower() if len(context.args) > 1 else 'csv'
+    # Rows are written to a temporary file as they are generated, so the
+    # export is never held in memory; the lock keeps the teams stable meanwhile
+    with tempfile.TemporaryFile() as file:
+        async with tournament_locks.hold(tournament_id):
+            tournament = await find_tournament(tournament_id)
+            if tournament is None:
+                await update.message.reply_text("❌ Tournament not found!")
+                return
+            if tournament_id in tournaments:
+                tournament_teams = (teams[team_id] for team_id in iter_tournament_team_ids(tournament_id, active_only=True))
+            else:
+                tournament_teams = [team for team in archive_cache[tournament_id]['teams'] if team.get('status') == 'active']
+            writer = ExportWriter(file, export_format)
+            for row in export_rows(tournament, tournament_teams):
+                writer.write(row)
+                if writer.rows % 1000 == 0:
+                    await asyncio.sleep(0)
+            writer.finish()
         
-        if match['team2']:  # Only show buttons if it's a real match
-            keyboard = [
-                [
-                    InlineKeyboardButton(f"🏆 {match['team1']['name']}", 
-                                      callback_data=f"report_winner_{match['id']}_{match['team1']['id']}"),
-                    InlineKeyboardButton(f"🏆 {team2_name}", 
-                                      callback_data=f"report_winner_{match['id']}_{match['team2']['id']}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            for admin_id in ADMINS:
-                try:
-                    await context.bot.send_message(
-                        admin_id,
-                        f"Match: {match['team1']['name']} vs {team2_name}",
-                        reply_markup=reply_markup
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to send match to admin {admin_id}: {e}")
-    
-    await notify_admins(context, text)
-
-async def report_match_winner(query, context, match_id, winner_team_id):
-    """Report match winner"""
-    tournament_id = match_id.split('_')[1]
-    
-    if tournament_id not in tournaments:
-        await query.edit_message_text("❌ Tournament not found!")
+        await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=file,
+            filename=f"{tournament_id}.{export_format}",
+            caption=f"📤 {tournament['name']}: {writer.rows} rows"
+        )
+
+async def generate_bracket(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Generate tournament bracket - /generate_bracket <tournament_id>"""
+    if update.effective_user.id not in ADMINS:
+        await update.message.reply_text("❌ Admin access required!")
         return
     
-    tournament = tournaments[tournament_id]
-    match = next((m for m in tournament['bracket']['matches'] if m['id'] == match_id), None)
-    
-    if not match:
-        await query.edit_message_text("❌ Match not found!")
+    if not context.args:
+        await update.message.reply_text("Usage: /generate_bracket <tournament_id>")
         return
     
-    match['winner'] = winner_team_id
-    save_data(tournaments, TOURNAMENTS_FILE)
+    tournament_id = context.args[0]
+    async with tournament_locks.hold(tournament_id):
+        if tournament_id not in tournaments:
+            await update.message.reply_text("❌ Tournament not found!")
+            return
+        
+        tournament_teams = get_tournament_teams(tournament_id, active_only=True)
+        
+        if len(tournament_teams) < 2:
+            await update.message.reply_text("❌ Need at least 2 teams to generate bracket!")
+            return
+        
+        # Seed teams randomly; the engines fill odd fields up with byes
+        random.shuffle(tournament_teams)
+        team_ids = [t['id'] for t in tournament_teams]
+        tournament_format = tournaments[tournament_id].get('format', 'single_elimination')
+        if tournament_format == 'round_robin':
+            tournaments[tournament_id]['bracket'] = create_round_robin(team_ids)
+        elif tournament_format == 'swiss':
+            tournaments[tournament_id]['bracket'] = create_swiss(team_ids)
+        else:
+            tournaments[tournament_id]['bracket'] = create_bracket(team_ids)
+        set_tournament_status(tournament_id, 'started')
+        
+        mark_dirty('tournaments', tournament_id)
+        # The round messages are written together with the bracket
+        send_round_to_admins(context, tournament_id, tournaments[tournament_id]['bracket']['current_round'])
+        saved = await flush_now()
     
-    winner_team = teams[winner_team_id]
-    await query.edit_message_text(f"✅ Winner recorded: {winner_team['name']}")
+    if saved:
+        await update.message.reply_text(f"✅ Bracket generated for {tournaments[tournament_id]['name']}!")
+    else:
+        await update.message.reply_text("❌ Failed to generate bracket!")
+
+def message_length(text):
+    """Return the length of a message as Telegram counts it, in UTF-16 code units"""
+    return len(text.encode('utf-16-le')) // 2
+
+def clip_message(text):
+    """Cut a text to MESSAGE_LIMIT, marking the cut with an ellipsis"""
+    if message_length(text) <= MESSAGE_LIMIT:
+        return text
+    # A surrogate pair split by the cut is dropped
+    return text.encode('utf-16-le')[:2 * (MESSAGE_LIMIT - 1)].decode('utf-16-le', errors='ignore') + "…"
+
+def round_page(bracket, round_number, page):
+    """Return the pending matches on one page of a round, the clamped page, the page count and the pending total"""
+    pending = [m for m in engine(bracket).round_matches(bracket, round_number) if m['team2'] and not m['winner']]
+    pages = max(1, (len(pending) + ROUND_PAGE_SIZE - 1) // ROUND_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    return pending[page * ROUND_PAGE_SIZE:(page + 1) * ROUND_PAGE_SIZE], page, pages, len(pending)
+
+def round_message_text(tournament, round_number, page=0):
+    """Render the status of one round: the open matches on the keyboard's page, then the results
+
+    The text always fits in one message. Results that do not fit are counted
+    instead of listed, and a text made too long by the names alone is cut.
+    """
+    if round_number == 1:
+        text = f"🎯 Bracket for {tournament['name']} - Round 1:\n"
+    else:
+        text = f"🎯 {tournament['name']} - Round {round_number}:\n"
     
-    # Check if round is complete
-    await check_round_completion(context, tournament_id)
+    bracket = tournament['bracket']
+    page_matches, page, pages, pending = round_page(bracket, round_number, page)
+    if pending:
+        text += f"Page {page + 1}/{pages} · {pending} matches open\n\n" if pages > 1 else f"{pending} matches open\n\n"
+        for match in page_matches:
+            text += f"⚔️ {team_name(match['team1'])} vs {team_name(match['team2'])}\n"
+    else:
+        text += "Round complete!\n\n"
+    
+    bye_text = "advances (bye)" if bracket.get('format', 'single_elimination') == 'single_elimination' else "has a bye"
+    results = []
+    for match in engine(bracket).round_matches(bracket, round_number):
+        if not match['team2']:
+            results.append(f"⏭️ {team_name(match['team1'])} {bye_text}\n")
+        elif match['winner']:
+            loser = match['team2'] if match['winner'] == match['team1'] else match['team1']
+            results.append(f"✅ {team_name(match['winner'])} beat {team_name(loser)}\n")
+    
+    if pending and results:
+        text += "\n"
+    room = MESSAGE_LIMIT - message_length(text) - message_length(f"… and {len(results)} more results\n")
+    for shown, line in enumerate(results):
+        room -= message_length(line)
+        if room < 0:
+            text += f"… and {len(results) - shown} more results\n"
+            break
+        text += line
+    return clip_message(text.rstrip("\n"))
 
-async def check_round_completion(context, tournament_id):
-    """Check if current round is complete and generate next round"""
-    tournament = tournaments[tournament_id]
-    current_round = tournament['bracket']['current_round']
-    current_matches = [m for m in tournament['bracket']['matches'] if m['round'] == current_round]
+def round_keyboard(tournament_id, round_number, page):
+    """Build one page of winner buttons for the pending matches of a round"""
+    page_matches, page, pages, _ = round_page(tournaments[tournament_id]['bracket'], round_number, page)
+    if not page_matches:
+        return None
     
-    if all(m.get('winner') for m in current_matches):
-        await generate_next_round(context, tournament_id)
+    keyboard = []
+    for match in page_matches:
+        keyboard.append([
+            InlineKeyboardButton(f"🏆 {team_name(match['team1'])}", 
+                              callback_data=encode_callback('report_winner', match_id=match['id'], slot=1,
+                                                            page=page, tournament_id=tournament_id)),
+            InlineKeyboardButton(f"🏆 {team_name(match['team2'])}", 
+                              callback_data=encode_callback('report_winner', match_id=match['id'], slot=2,
+                                                            page=page, tournament_id=tournament_id))
+        ])
+    
+    navigation = page_navigation(
+        lambda p: encode_callback('round_page', round_number=round_number, page=p, tournament_id=tournament_id),
+        page, pages
+    )
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard)
+
+def send_round_to_admins(context, tournament_id, round_number):
+    """Send one consolidated message for a round to every admin"""
+    queue_round_message(tournament_id, round_number, outbox.new_key(), bot=context.bot)
 
-async def generate_next_round(context, tournament_id):
-    """Generate next round matches"""
+def queue_round_message(tournament_id, round_number, key, bot=None):
+    """Queue the message of a round to every admin under the outbox key `key`"""
     tournament = tournaments[tournament_id]
-    current_round = tournament['bracket']['current_round']
-    winners = [m['winner'] for m in tournament['bracket']['matches'] if m['round'] == current_round and m['winner']]
-    
-    if len(winners) <= 1:
-        await finish_tournament(context, tournament_id, winners[0] if winners else None)
-        return
-    
-    # Create next round
-    next_round = current_round + 1
-    matches = []
-    
-    for i in range(0, len(winners), 2):
-        if i + 1 < len(winners):
-            match_id = f"match_{tournament_id}_{len(tournament['bracket']['matches'])}"
-            matches.append({
-                'id': match_id,
-                'team1': teams[winners[i]],
-                'team2': teams[winners[i + 1]],
-                'winner': None,
-                'round': next_round
-            })
-    
-    tournament['bracket']['matches'].extend(matches)
-    tournament['bracket']['current_round'] = next_round
-    save_data(tournaments, TOURNAMENTS_FILE)
+    text = round_message_text(tournament, round_number)
+    reply_markup = round_keyboard(tournament_id, round_number, 0)
     
-    await send_next_round_to_admins(context, tournament_id, next_round)
+    for admin_id in ADMINS:
+        outbox.enqueue(
+            f"{key}:{admin_id}", admin_id, bot=bot,
+            receipt=['round_message', tournament_id, round_number], text=text, reply_markup=reply_markup
+        )
+
+def remember_round_message(admin_id, message, tournament_id, round_number):
+    """Store the id of an admin's round message so it can be edited later"""
+    bracket = tournaments.get(tournament_id, {}).get('bracket')
+    if bracket is None:
+        return
+    if round_number < bracket['current_round'] or bracket['status'] == 'finished':
+        # The round finished while the message was queued
+        outbox.enqueue(
+            f"close:{admin_id}:{message.message_id}", admin_id, 'edit_message_text',
+            message_id=message.message_id, text=round_message_text(tournaments[tournament_id], round_number)
+        )
+        return
+    round_messages = bracket.setdefault('round_messages', {}).setdefault(str(round_number), {})
+    round_messages[str(admin_id)] = message.message_id
+    mark_dirty('tournaments', tournament_id)
+
+outbox.receipts['round_message'] = remember_round_message
 
-async def send_next_round_to_admins(context, tournament_id, round_number):
-    """Send next round to admins"""
+def close_round_messages(context, tournament_id, round_number):
+    """Replace every admin's message for a finished round with its results"""
     tournament = tournaments[tournament_id]
-    round_matches = [m for m in tournament['bracket']['matches'] if m['round'] == round_number]
-    
-    text = f"🎯 Round {round_number}:\n\n"
+    text = round_message_text(tournament, round_number)
+    round_messages = tournament['bracket'].get('round_messages', {}).pop(str(round_number), {})
+    for admin_id, message_id in round_messages.items():
+        outbox.enqueue(
+            f"close:{admin_id}:{message_id}", int(admin_id), 'edit_message_text',
+            bot=context.bot, message_id=message_id, text=text
+        )
+
+async def show_round_page(query, context, tournament_id, round_number, page):
+    """Switch a round message to another page of open matches"""
+    if tournament_id not in tournaments or 'bracket' not in tournaments[tournament_id]:
+        await query.edit_message_text("❌ Tournament not found!")
+        return
     
-    for match in round_matches:
-        text += f"⚔️ {match['team1']['name']} vs {match['team2']['name']}\n"
-        
-        keyboard = [
-            [
-                InlineKeyboardButton(f"🏆 {match['team1']['name']}", 
-                                  callback_data=f"report_winner_{match['id']}_{match['team1']['id']}"),
-                InlineKeyboardButton(f"🏆 {match['team2']['name']}", 
-                                  callback_data=f"report_winner_{match['id']}_{match['team2']['id']}")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        round_message_text(tournaments[tournament_id], round_number, page),
+        reply_markup=round_keyboard(tournament_id, round_number, page)
+    )
+
+async def report_match_winner(query, context, tournament_id, match_id, slot, page=0):
+    """Report match winner"""
+    # The edits stay under the lock so a slow edit never overwrites a newer one
+    async with tournament_locks.hold(tournament_id):
+        if tournament_id not in tournaments or 'bracket' not in tournaments[tournament_id]:
+            await query.edit_message_text("❌ Tournament not found!")
+            return
         
-        for admin_id in ADMINS:
-            try:
-                await context.bot.send_message(
-                    admin_id,
-                    f"Match: {match['team1']['name']} vs {match['team2']['name']}",
-                    reply_markup=reply_markup
+        tournament = tournaments[tournament_id]
+        bracket = tournament['bracket']
+        match = engine(bracket).get_match(bracket, match_id)
+        try:
+            completed_round = engine(bracket).report_winner(bracket, match_id, slot)
+        except BracketError as e:
+            # Refresh the stale message so the admin sees the current state
+            if match:
+                await query.edit_message_text(
+                    clip_message(f"❌ {e}!\n\n{round_message_text(tournament, match['round'], page)}"),
+                    reply_markup=round_keyboard(tournament_id, match['round'], page)
                 )
-            except Exception as e:
-                logger.error(f"Failed to send match to admin {admin_id}: {e}")
+            else:
+                await query.edit_message_text(f"❌ {e}!")
+            return
+        
+        mark_dirty('tournaments', tournament_id)
+        
+        if completed_round is None:
+            await query.edit_message_text(
+                round_message_text(tournament, match['round'], page),
+                reply_markup=round_keyboard(tournament_id, match['round'], page)
+            )
+            return
+        
+        close_round_messages(context, tournament_id, completed_round)
+        if bracket['status'] == 'finished':
+            finish_tournament(context, tournament_id, bracket['winner'])
+        else:
+            send_round_to_admins(context, tournament_id, bracket['current_round'])
+
+def bracket_round_data(bracket, round_number):
+    """Describe one round for the renderer: names and winning slot per node"""
+    slots = bracket['slots']
+    nodes = []
+    for node in round_nodes(bracket, round_number):
+        team1, team2 = slots[2 * node], slots[2 * node + 1]
+        if team1 == BYE and team2 == BYE:
+            nodes.append(None)
+            continue
+        names = tuple("TBD" if team is None else "BYE" if team == BYE else team_name(team) for team in (team1, team2))
+        winner = slots[node]
+        winner_slot = 0 if winner is None else 1 if winner == team1 else 2
+        nodes.append(names + (winner_slot,))
+    return tuple(nodes)
+
+async def render_bracket_image(tournament):
+    """Render a bracket as PNG, redrawing only round columns that changed"""
+    bracket = tournament['bracket']
+    rounds = bracket['rounds']
+    
+    tiles = {}
+    missing = []
+    for round_number in range(1, rounds + 1):
+        round_data = bracket_round_data(bracket, round_number)
+        key = hashlib.sha256(repr((bracket['size'], round_number, round_data)).encode()).hexdigest()
+        if key in bracket_tiles:
+            bracket_tiles.move_to_end(key)
+            tiles[round_number] = bracket_tiles[key]
+        else:
+            missing.append((round_number, key, round_data))
+    
+    if bracket['status'] == 'finished':
+        subtitle = f"Champion: {team_name(bracket['winner'])}"
+    else:
+        subtitle = f"Round {bracket['current_round']} of {rounds}"
+    
+    rendered = await asyncio.gather(*[
+        render_image(render_round_tile, round_number, bracket['size'], round_data, round_number == rounds)
+        for round_number, key, round_data in missing
+    ])
+    for (round_number, key, _), tile in zip(missing, rendered):
+        tiles[round_number] = bracket_tiles[key] = tile
+    while len(bracket_tiles) > BRACKET_TILE_CACHE_SIZE:
+        bracket_tiles.popitem(last=False)
+    
+    return await render_image(compose_bracket, [tiles[r] for r in range(1, rounds + 1)], tournament['name'], subtitle)
+
+async def send_bracket_image(context, chat_id, tournament_id, tournament):
+    """Send the bracket image, reusing the uploaded file until the bracket changes"""
+    if not tournament or tournament.get('bracket', {}).get('format') != 'single_elimination':
+        await context.bot.send_message(chat_id=chat_id, text="❌ No bracket for this tournament yet!")
+        return
+    
+    bracket = tournament['bracket']
+    if bracket['size'] > MAX_BRACKET_IMAGE_TEAMS:
+        await context.bot.send_message(chat_id=chat_id, text="❌ Bracket is too large to draw!")
+        return
+    
+    caption = f"🎯 Bracket for {tournament['name']}"
+    image = bracket.get('image')
+    if image and image['version'] == bracket.get('version', 0):
+        await context.bot.send_photo(chat_id=chat_id, photo=image['file_id'], caption=caption)
+        return
     
-    await notify_admins(context, text)
+    version = bracket.get('version', 0)
+    try:
+        data = await render_bracket_image(tournament)
+    except Exception as e:
+        logger.error(f"Failed to render bracket for {tournament_id}: {e}")
+        await context.bot.send_message(chat_id=chat_id, text="❌ Failed to draw bracket!")
+        return
+    
+    message = await context.bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+    if bracket.get('version', 0) == version:
+        bracket['image'] = {'version': version, 'file_id': message.photo[-1].file_id}
+        if tournament_id in tournaments:
+            mark_dirty('tournaments', tournament_id)
+
+def standings_text(tournament):
+    """Render the standings of a round-robin or Swiss tournament"""
+    bracket = tournament['bracket']
+    if bracket['status'] == 'finished':
+        text = f"📊 Final standings of {tournament['name']}:\n\n"
+    else:
+        text = f"📊 {tournament['name']} - Round {bracket['current_round']} of {bracket['rounds']}:\n\n"
+    
+    rows = league.standings(bracket)
+    for position, (team_id, wins, losses) in enumerate(rows[:STANDINGS_LIMIT], 1):
+        text += f"{position}. {team_name(team_id)} - {wins}W {losses}L\n"
+    if len(rows) > STANDINGS_LIMIT:
+        text += f"... and {len(rows) - STANDINGS_LIMIT} more teams\n"
+    return text
+
+async def send_bracket(context, chat_id, tournament_id):
+    """Send the bracket image or, for round-robin and Swiss, the standings"""
+    tournament = await find_tournament(tournament_id)
+    if tournament and tournament.get('bracket', {}).get('format') in ('round_robin', 'swiss'):
+        await context.bot.send_message(chat_id=chat_id, text=standings_text(tournament))
+    else:
+        await send_bracket_image(context, chat_id, tournament_id, tournament)
 
-async def finish_tournament(context, tournament_id, winner_team_id):
-    """Finish tournament and announce results"""
+async def show_bracket(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show a tournament bracket or standings - /bracket <tournament_id>"""
+    if not context.args:
+        await update.message.reply_text("Usage: /bracket <tournament_id>")
+        return
+    
+    await send_bracket(context, update.effective_chat.id, context.args[0])
+
+def finish_tournament(context, tournament_id, winner_team_id):
+    """Mark a tournament finished and announce results
+
+    It stays in the working set for ARCHIVE_AFTER seconds, then the tiering
+    pass moves it to the archive.
+    """
     tournament = tournaments[tournament_id]
-    winner_team = teams[winner_team_id] if winner_team_id else None
+    tournament['finished_at'] = datetime.now().isoformat()
+    set_tournament_status(tournament_id, 'finished')
+    mark_dirty('tournaments', tournament_id)
     
-    if winner_team:
+    if winner_team_id:
         text = (
             f"🏆 TOURNAMENT FINISHED! 🏆\n\n"
             f"Tournament: {tournament['name']}\n"
-            f"1st Place: {winner_team['name']} 🥇\n"
+            f"1st Place: {team_name(winner_team_id)} 🥇\n"
             f"Congratulations to the winners! 🎉"
         )
     else:
         text = f"Tournament {tournament['name']} finished!"
     
-    await notify_admins(context, text)
+    notify_admins(context, text, key=f"finished:{tournament_id}")
+
+# Tiering: finished tournaments leave the working set, unused roster photos are deleted
+async def archive_tournament(tournament_id):
+    """Move a finished tournament and its teams from the working set to the archive"""
+    async with tournament_locks.hold(tournament_id):
+        tournament = tournaments.get(tournament_id)
+        if tournament is None or tournament['status'] != 'finished':
+            return False
+        tournament_teams = get_tournament_teams(tournament_id)
+        # The archive is durable before the records are deleted from storage,
+        # so a crash in between only means archiving it again
+        await asyncio.to_thread(archive.write, tournament_id, archive.encode(tournament, tournament_teams))
+        remove_tournament(tournament_id)
+        for team in tournament_teams:
+            remove_team(team['id'])
+            mark_dirty('teams', team['id'])
+        mark_dirty('tournaments', tournament_id)
+    archived_count.inc()
+    return True
+
+async def archive_finished_tournaments():
+    """Archive the tournaments that finished more than ARCHIVE_AFTER seconds ago"""
+    cutoff = datetime.now() - timedelta(seconds=ARCHIVE_AFTER)
+    archived = 0
+    # Every finished tournament is checked: after a restart the status index
+    # is in load order, not in the order they finished
+    for tournament_id in list(tournaments_by_status.get('finished', {})):
+        finished_at = tournaments.get(tournament_id, {}).get('finished_at')
+        if finished_at and datetime.fromisoformat(finished_at) > cutoff:
+            continue
+        if await archive_tournament(tournament_id):
+            archived += 1
+    if archived:
+        await flush_now()
+        logger.info(f"Archived {archived} finished tournaments")
+    return archived
+
+def live_roster_photos():
+    """Return the roster photos of teams in the working set and of registrations in progress"""
+    photos = {photo for team in teams.values() for photo in team.get('roster_photos', ()) if photo}
+    for record in user_states.entries.values():
+        for unique_id in record['data'].get('roster_unique_ids', ()):
+            if unique_id in roster_downloader.known:
+                photos.add(roster_downloader.known[unique_id])
+    return photos
+
+async def collect_roster_files():
+    """Delete roster photos that no team, archived team or registration uses"""
+    max_mtime = time.time() - ROSTER_GC_MIN_AGE
+    referenced = live_roster_photos() | await asyncio.to_thread(archive.photo_names)
+    candidates = await asyncio.to_thread(roster_downloader.unreferenced_files, referenced, max_mtime)
+    if not candidates:
+        return 0
+    # A registration may have reused one of them while the directory was
+    # listed; stop handing them out, then check the live teams again
+    roster_downloader.forget(candidates)
+    referenced = live_roster_photos()
+    removed = await asyncio.to_thread(
+        roster_downloader.remove_files, [name for name in candidates if name not in referenced], max_mtime
+    )
+    roster_files_removed.inc(amount=removed)
+    if removed:
+        logger.info(f"Deleted {removed} unused roster photos")
+    return removed
+
+async def run_tiering():
+    """Archive finished tournaments and collect roster photos every TIERING_INTERVAL seconds"""
+    await state_ready.wait()
+    while True:
+        await asyncio.sleep(TIERING_INTERVAL)
+        try:
+            await archive_finished_tournaments()
+            await collect_roster_files()
+        except Exception:
+            logger.exception("Tiering pass failed")
+
+def latency_lines(histogram, limit=10):
+    """Format the busiest series of a latency histogram for /stats"""
+    rows = sorted(histogram.summary().items(), key=lambda item: -item[1][0])[:limit]
+    return [
+        f"{name}: {count} × avg {mean * 1000:.0f} ms, p95 ≤ {p95 * 1000:.0f} ms"
+        for name, (count, mean, p95) in rows
+    ]
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show performance statistics - /stats"""
+    if update.effective_user.id not in ADMINS:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    
+    stats = persistence.stats()
+    outbox_stats = outbox.stats()
+    top_calls = sorted(api_calls.values.items(), key=lambda item: -item[1])[:8]
+    lines = [
+        f"📊 Persistence",
+        f"Flushes: {stats['flush_count']} ({stats['flush_failures']} failed)",
+        f"Mutations: {stats['mutations']}",
+        f"Records written: {stats['records_written']} ({stats['bytes_written'] / 1024:.1f} KiB)",
+        f"Pending: {stats['pending_records']}",
+        f"Coalescing ratio: {stats['coalescing_ratio']:.2f}",
+        f"Flush latency: last {stats['last_flush_latency'] * 1000:.1f} ms, "
+        f"avg {stats['avg_flush_latency'] * 1000:.1f} ms, max {stats['max_flush_latency'] * 1000:.1f} ms",
+        "",
+        f"📦 In memory: {len(tournaments)} tournaments, {len(teams)} teams, {len(user_states)} conversations",
+        f"🚀 Startup: " + ', '.join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup_phases.items()),
+        f"First update handled after {time_to_first_response or 0:.2f} s",
+        "",
+        f"📡 API calls: {api_calls.total()} ({retry_after_hits.total()} RetryAfter)",
+        *(f"{method}: {count}" for method, count in top_calls),
+        "",
+        f"📮 Outbox: {outbox_stats['pending']} pending, {outbox_stats['dead']} dead letters, "
+        f"{outbox_stats['delivered']} delivered, {outbox_stats['retried']} retried",
+        f"🗄 Archive: {archived_count.total()} tournaments archived, {len(archive_cache)} loaded, "
+        f"{roster_files_removed.total()} unused roster photos deleted",
+        f"🗂 View cache: {len(view_cache.entries)} menus, hit rate "
+        + (', '.join(f"{view} {rate:.0%}" for view, rate in sorted(view_cache.hit_rates().items())) or "n/a"),
+        "",
+        "⏱ Handlers",
+        *latency_lines(handler_latency),
+        "",
+        "⏱ Buttons",
+        *latency_lines(callback_latency),
+    ]
+    await update.message.reply_text('\n'.join(lines))
+
+async def show_outbox(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show undelivered notifications and queue dead letters again - /outbox [retry]"""
+    if update.effective_user.id not in ADMINS:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    
+    if context.args and context.args[0].lower() == 'retry':
+        count = outbox.retry_dead()
+        await update.message.reply_text(f"🔁 Queued {count} dead letters again.")
+        return
+    
+    counts = outbox.counts()
+    dead_letters = outbox.dead_letters()
+    lines = [f"📮 Outbox: {counts['pending']} pending, {counts['dead']} dead letters, {counts['sent']} recently sent"]
+    for key, record in dead_letters[:10]:
+        lines.append(f"• {record['method']} to {record['chat_id']}, {record['attempts']} attempts: {record['error']}")
+    if dead_letters:
+        lines.append("\nSend /outbox retry to queue them again.")
+    await update.message.reply_text('\n'.join(lines))
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all messages"""
     if update.message and update.message.text and not update.message.text.startswith('/'):
-        user_id = update.effective_user.id
-        if user_id in user_states:
-            state = user_states[user_id].get('state')
-            if state == 'waiting_team_name':
-                await handle_team_name(update, context)
-            elif state == 'waiting_leader_username':
-                await handle_leader_username(update, context)
+        async with user_locks.hold(update.effective_user.id):
+            user_data = user_states.get(update.effective_user.id)
+            if user_data:
+                state = user_data.get('state')
+                if state == 'waiting_team_name':
+                    await handle_team_name(update, context)
+                elif state == 'waiting_leader_username':
+                    await handle_leader_username(update, context)
+
+# Callback operation name (see callbacks.py) -> handler(query, context, **arguments)
+CALLBACK_ROUTES = {
+    'noop': noop,
+    'main_menu': show_main_menu,
+    'tournaments': show_tournaments,
+    'join_tournament': join_tournament_start,
+    'teams_list': show_teams_list,
+    'tournament_teams': show_tournament_teams,
+    'view_bracket': view_bracket,
+    'team_details': show_team_details,
+    'admin_panel': admin_panel,
+    'create_tournament_help': create_tournament_help,
+    'admin_manage_teams': admin_manage_teams,
+    'admin_delete_team_menu': admin_delete_team_menu,
+    'admin_delete_team': admin_delete_team_confirm,
+    'admin_delete_tournament_menu': admin_delete_tournament_menu,
+    'admin_delete_tournament': admin_delete_tournament_confirm,
+    'report_winner': report_match_winner,
+    'round_page': show_round_page,
+}
+
+async def post_init(application: Application):
+    """Start background tasks once the event loop is running"""
+    global metrics_server, tiering_task
+    mark_startup('initialize')
+    # The webhook starts listening when this returns; state loads meanwhile
+    asyncio.get_running_loop().create_task(load_state(application))
+    persistence.start()
+    user_states.start()
+    if tiering_task is None:
+        tiering_task = asyncio.get_running_loop().create_task(run_tiering())
+    outbox.start(application.bot)
+    if METRICS_PORT and metrics_server is None:
+        try:
+            metrics_server = await serve_metrics(metrics, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.error(f"Could not serve metrics on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+async def post_stop(application: Application):
+    """Finish queued downloads and notifications while the bot can still send"""
+    await roster_downloader.stop()
+    # What is not sent by then stays in the outbox for the next start
+    await outbox.stop()
+    await dispatcher.stop()
+
+async def post_shutdown(application: Application):
+    """Write pending changes and stop worker processes before the process exits"""
+    if tiering_task is not None:
+        tiering_task.cancel()
+        await asyncio.gather(tiering_task, return_exceptions=True)
+    await user_states.stop()
+    await persistence.stop()
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    if render_pool is not None:
+        render_pool.shutdown()
+
+def instrumented(handler):
+    """Observe the latency of an update handler under its name"""
+    return timed(handler_latency, handler.__name__, handler)
 
 def main():
     """Start the bot"""
@@ -750,15 +2067,36 @@ def main():
         return
     
     # Create application
-    application = Application.builder().token(token).build()
+    application = (
+        Application.builder()
+        .token(token)
+        .request(InstrumentedRequest(api_calls, retry_after_hits, connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest(api_calls, retry_after_hits))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
-    # Add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("create", create_tournament))
-    application.add_handler(CommandHandler("generate_bracket", generate_bracket))
-    application.add_handler(CallbackQueryHandler(button_handler))
-    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Add handlers; updates wait in group -1 until state is loaded
+    application.add_handler(TypeHandler(Update, wait_for_state), group=-1)
+    application.add_handler(CommandHandler("start", instrumented(start)))
+    application.add_handler(CommandHandler("create", instrumented(create_tournament)))
+    application.add_handler(CommandHandler("generate_bracket", instrumented(generate_bracket)))
+    application.add_handler(CommandHandler("bracket", instrumented(show_bracket)))
+    application.add_handler(CommandHandler("stats", instrumented(show_stats)))
+    application.add_handler(CommandHandler("import", instrumented(import_document)))
+    application.add_handler(CommandHandler("export", instrumented(export_tournament)))
+    application.add_handler(CommandHandler("outbox", instrumented(show_outbox)))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/import(@\w+)?(\s|$)'), instrumented(import_document)
+    ))
+    application.add_handler(CallbackQueryHandler(instrumented(button_handler)))
+    application.add_handler(MessageHandler(filters.PHOTO, instrumented(handle_photo)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented(handle_message)))
+    application.add_handler(TypeHandler(Update, record_first_response), group=1)
+    mark_startup('build_application')
     
     # Start the bot
     port = int(os.environ.get('PORT', 8443))
@@ -775,6 +2113,11 @@ def main():
     else:
         # Polling mode for development
         application.run_polling()
+    
+    store.close()
+    save_warm_snapshot()
+
+mark_startup('import')
 
 if __name__ == '__main__':
     main()
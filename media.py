@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+class RosterDownloader:
+    """Download roster photos in the background into content-addressed files
+
+    Photos are identified by Telegram's file_unique_id. Each one is fetched at
+    most once, by a bounded pool of workers, and stored as `<sha256>.jpg`, so
+    the same image sent by different teams or users shares a single file.
+    """
+
+    def __init__(self, directory, concurrency=4):
+        self.directory = directory
+        self.concurrency = concurrency
+        self.known = {}  # file_unique_id -> stored filename
+        self._in_flight = {}  # file_unique_id -> future of the stored filename
+        self._queue = asyncio.Queue()
+        self._workers = []
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    def remember(self, unique_id, filename):
+        """Register a photo that is already stored"""
+        if unique_id and filename:
+            self.known[unique_id] = filename
+
+    def forget(self, filenames):
+        """Stop handing out stored files that are about to be deleted"""
+        filenames = set(filenames)
+        self.known = {unique_id: name for unique_id, name in self.known.items() if name not in filenames}
+
+    def unreferenced_files(self, referenced, max_mtime):
+        """Return stored photos not in `referenced` and unused since max_mtime; blocking"""
+        return [
+            entry.name for entry in os.scandir(self.directory)
+            if entry.name.endswith('.jpg') and entry.name not in referenced and entry.stat().st_mtime < max_mtime
+        ]
+
+    def remove_files(self, filenames, max_mtime):
+        """Delete stored photos still unused since max_mtime; blocking, returns how many were deleted"""
+        removed = 0
+        for filename in filenames:
+            path = os.path.join(self.directory, filename)
+            try:
+                # A download may have reused the file since it was listed
+                if os.stat(path).st_mtime < max_mtime:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def request(self, bot, file_id, unique_id):
+        """Return a future of the stored filename, queueing a download if needed"""
+        loop = asyncio.get_running_loop()
+        if unique_id in self.known:
+            future = loop.create_future()
+            future.set_result(self.known[unique_id])
+            return future
+        if unique_id in self._in_flight:
+            return self._in_flight[unique_id]
+
+        self.start()
+        future = self._in_flight[unique_id] = loop.create_future()
+        self._queue.put_nowait((bot, file_id, unique_id, future))
+        return future
+
+    def start(self):
+        """Start the worker pool on the running loop"""
+        if self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout=30.0):
+        """Finish queued downloads, then stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Abandoning {self._queue.qsize()} queued roster downloads on shutdown")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def pending(self):
+        """Return the number of downloads queued or running"""
+        return len(self._in_flight)
+
+    async def _worker(self):
+        """Download queued photos one at a time"""
+        while True:
+            bot, file_id, unique_id, future = await self._queue.get()
+            try:
+                filename = await self._download(bot, file_id)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to download roster photo {unique_id}: {e}")
+                filename = None
+            else:
+                self.known[unique_id] = filename
+            finally:
+                del self._in_flight[unique_id]
+                self._queue.task_done()
+            if not future.done():
+                future.set_result(filename)
+
+    async def _download(self, bot, file_id):
+        """Fetch one photo and store it under its content hash"""
+        photo_file = await bot.get_file(file_id)
+        data = bytes(await photo_file.download_as_bytearray())
+        filename = f"{hashlib.sha256(data).hexdigest()}.jpg"
+        path = os.path.join(self.directory, filename)
+        try:
+            # Touching an existing file marks it as used, so garbage collection keeps it
+            os.utime(path)
+        except FileNotFoundError:
+            await asyncio.to_thread(self._write_file, path, data)
+            self.downloaded += 1
+        else:
+            self.deduplicated += 1
+        return filename
+
+    @staticmethod
+    def _write_file(path, data):
+        """Write a file atomically so readers never see a partial photo"""
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
@@ -0,0 +1,228 @@
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a fast in-memory handler to a slow upload
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    """Escape a label value for the text exposition"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    """Format label pairs the way Prometheus text exposition expects"""
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    """Format a sample value"""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by the value of one label"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}  # label value (None without a label) -> count
+
+    def inc(self, label_value=None, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        """Yield (name, label pairs, value) for the exposition"""
+        for label_value, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            pairs = [(self.label, label_value)] if self.label else []
+            yield self.name, pairs, value
+
+
+class Gauge:
+    """Current value read from `func` at scrape time
+
+    With a label, func returns {label value: value}.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, func, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.label = label
+
+    def samples(self):
+        if self.label is None:
+            yield self.name, [], self.func()
+            return
+        for label_value, value in self.func().items():
+            yield self.name, [(self.label, label_value)], value
+
+
+class Histogram:
+    """Distribution of durations in fixed buckets, optionally split by one label
+
+    Only bucket counts, the sum and the count are kept per label value, so
+    observing is O(buckets) and memory does not grow with traffic.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}  # label value -> [per-bucket counts, sum, count]
+
+    def observe(self, value, label_value=None):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, label_value=None):
+        """Observe the duration of the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, label_value)
+
+    def quantile(self, label_value, fraction):
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        counts, _, count = self.series[label_value]
+        rank = fraction * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def summary(self):
+        """Return {label value: (count, mean, estimated p95)}"""
+        return {
+            label_value: (count, total / count, self.quantile(label_value, 0.95))
+            for label_value, (_, total, count) in self.series.items()
+            if count
+        }
+
+    def samples(self):
+        for label_value, (counts, total, count) in sorted(self.series.items(), key=lambda item: str(item[0])):
+            pairs = [(self.label, label_value)] if self.label else []
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", pairs + [('le', repr(float(bound)))], cumulative
+            yield f"{self.name}_bucket", pairs + [('le', '+Inf')], count
+            yield f"{self.name}_sum", pairs, total
+            yield f"{self.name}_count", pairs, count
+
+
+class Registry:
+    """A set of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label=None):
+        return self._register(Counter(name, help_text, label))
+
+    def gauge(self, name, help_text, func, label=None):
+        return self._register(Gauge(name, help_text, func, label))
+
+    def histogram(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label, buckets))
+
+    def render(self):
+        """Return the text exposition of every metric"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, pairs, value in metric.samples():
+                lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def timed(histogram, label_value, handler):
+    """Wrap an async handler so every call is observed in histogram"""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with histogram.time(label_value):
+            return await handler(*args, **kwargs)
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that counts Bot API calls and RetryAfter answers by method"""
+
+    def __init__(self, api_calls, retry_after_hits, **kwargs):
+        super().__init__(**kwargs)
+        self.api_calls = api_calls
+        self.retry_after_hits = retry_after_hits
+
+    async def post(self, url, *args, **kwargs):
+        method = url.rsplit('/', 1)[-1]
+        self.api_calls.inc(method)
+        try:
+            return await super().post(url, *args, **kwargs)
+        except RetryAfter:
+            self.retry_after_hits.inc(method)
+            raise
+
+
+async def serve(registry, host, port, path='/metrics'):
+    """Serve registry.render() over HTTP on host:port and return the server"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass  # headers are not needed
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == path:
+                status, content_type, body = '200 OK', 'text/plain; version=0.0.4', registry.render().encode()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'Not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}{path}")
+    return server
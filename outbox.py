@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from functools import partial
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENT = 'sent'
+DEAD = 'dead'
+
+
+class Outbox:
+    """Durable queue of outgoing Bot API calls
+
+    Handlers `enqueue` calls instead of making them. Entries are plain
+    records in `entries`, keyed by an idempotency key, and every change is
+    reported through `on_change(key)`, so the write-behind flusher persists
+    an entry in the same write as the state change that produced it. A
+    background worker calls `flush` before sending anything, so nothing is
+    sent that a crash could take back, then hands due entries to the
+    Dispatcher, which applies the rate limits.
+
+    Enqueueing a key that is already present does nothing, and delivered
+    entries stay as tombstones for `keep_sent` seconds, so an event handled
+    twice notifies once. Delivery is at least once: a crash after a call
+    went out but before its result was saved sends it again on restart.
+
+    Forbidden and BadRequest errors cannot succeed on a retry and move the
+    entry to the dead letters at once. Other errors are retried with
+    exponential backoff, and after `max_attempts` the entry is dead-lettered.
+    Dead letters are kept for `keep_dead` seconds and can be requeued with
+    `retry_dead`.
+
+    Pending entries are also kept in a heap ordered by due time, so the
+    worker never scans the tombstones and dead letters. Heap items of entries
+    that were sent, rescheduled or removed since are skipped when they reach
+    the top.
+
+    A call whose result is needed later names a receipt: `receipt` is
+    [name, *args] and `receipts[name](chat_id, result, *args)` runs once the
+    call succeeded.
+    """
+
+    def __init__(self, dispatcher, flush, on_change=None, max_attempts=8, base_delay=5.0, max_delay=3600.0,
+                 keep_sent=3600, keep_dead=7 * 86400, prune_interval=60.0):
+        self.dispatcher = dispatcher
+        self.flush = flush  # coroutine function persisting everything marked dirty; False if it failed
+        self.on_change = on_change
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.keep_sent = keep_sent
+        self.keep_dead = keep_dead
+        self.prune_interval = prune_interval
+        self.entries = {}  # key -> record
+        self.receipts = {}  # receipt name -> function(chat_id, result, *args)
+        self.bot = None  # bot that delivers the calls, set by start() or the first enqueue
+        self._seq = 0
+        self._in_flight = set()  # keys handed to the dispatcher
+        self._due = []  # heap of (due, seq, key) of pending entries
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._pruned_at = 0.0
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    @staticmethod
+    def new_key():
+        """Return a key for a call that no other event can produce"""
+        return uuid.uuid4().hex[:16]
+
+    def load(self, records):
+        """Restore persisted entries; calls that were being sent are sent again"""
+        self.entries.update(records)
+        self._seq = max([self._seq] + [record['seq'] for record in records.values()])
+        for key, record in records.items():
+            if record['status'] == PENDING:
+                self._schedule(key, record)
+        self._wakeup.set()
+
+    def enqueue(self, key, chat_id, method='send_message', bot=None, receipt=None, **kwargs):
+        """Queue `bot.<method>(chat_id=chat_id, **kwargs)`; returns False if key was queued before"""
+        if bot is not None and bot is not self.bot:
+            self.bot = bot
+            self._wakeup.set()
+        if key in self.entries:
+            return False
+        if kwargs.get('reply_markup') is not None:
+            kwargs['reply_markup'] = kwargs['reply_markup'].to_dict()
+        else:
+            kwargs.pop('reply_markup', None)
+        self._seq += 1
+        self.entries[key] = {
+            'seq': self._seq,
+            'status': PENDING,
+            'chat_id': chat_id,
+            'method': method,
+            'kwargs': kwargs,
+            'receipt': receipt,
+            'attempts': 0,
+            'due': time.time(),
+            'error': None,
+        }
+        self._schedule(key, self.entries[key])
+        self._changed(key)
+        self._wakeup.set()
+        return True
+
+    def retry_dead(self):
+        """Queue every dead letter again; returns how many there were"""
+        now = time.time()
+        count = 0
+        for key, record in self.entries.items():
+            if record['status'] == DEAD:
+                record.update(status=PENDING, attempts=0, due=now)
+                self._schedule(key, record)
+                self._changed(key)
+                count += 1
+        if count:
+            self._wakeup.set()
+        return count
+
+    def counts(self):
+        """Return {status: number of entries}"""
+        counts = {PENDING: 0, SENT: 0, DEAD: 0}
+        for record in self.entries.values():
+            counts[record['status']] += 1
+        return counts
+
+    def dead_letters(self):
+        """Return the (key, record) of dead letters, oldest first"""
+        return sorted(
+            ((key, record) for key, record in self.entries.items() if record['status'] == DEAD),
+            key=lambda item: item[1]['seq']
+        )
+
+    def _changed(self, key):
+        """Report a written or removed entry"""
+        if self.on_change is not None:
+            self.on_change(key)
+
+    def _schedule(self, key, record):
+        """Put a pending entry on the heap at its due time"""
+        heapq.heappush(self._due, (record['due'], record['seq'], key))
+
+    def _is_current(self, item):
+        """Return True if a heap item still describes a pending entry waiting to be sent"""
+        due, _, key = item
+        record = self.entries.get(key)
+        return (
+            record is not None and record['status'] == PENDING and record['due'] == due
+            and key not in self._in_flight
+        )
+
+    def _next_due(self):
+        """Return the due time of the earliest entry waiting to be sent, or None"""
+        while self._due and not self._is_current(self._due[0]):
+            heapq.heappop(self._due)
+        return self._due[0][0] if self._due else None
+
+    def _send_due(self):
+        """Hand every due entry to the dispatcher, earliest first and in queue order at equal times"""
+        now = time.time()
+        due = []
+        while self._due and self._due[0][0] <= now:
+            item = heapq.heappop(self._due)
+            if self._is_current(item):
+                due.append(item)
+        for _, _, key in due:
+            if key in self._in_flight:
+                continue  # a duplicate heap item
+            record = self.entries[key]
+            kwargs = dict(record['kwargs'])
+            if 'reply_markup' in kwargs:
+                kwargs['reply_markup'] = InlineKeyboardMarkup.de_json(kwargs['reply_markup'], self.bot)
+            self._in_flight.add(key)
+            future = self.dispatcher.submit(self.bot, record['method'], record['chat_id'], **kwargs)
+            future.add_done_callback(partial(self._finished, key, record))
+
+    def _finished(self, key, record, future):
+        """Record the outcome of one call"""
+        self._in_flight.discard(key)
+        if future.cancelled() or self.entries.get(key) is not record:
+            return
+        error = future.exception()
+        now = time.time()
+        if error is None or (isinstance(error, BadRequest) and 'not modified' in error.message.lower()):
+            self.entries[key] = {'seq': record['seq'], 'status': SENT, 'done_at': now}
+            self.sent += 1
+            receipt = record.get('receipt')
+            if receipt and error is None:
+                try:
+                    self.receipts[receipt[0]](record['chat_id'], future.result(), *receipt[1:])
+                except Exception:
+                    logger.exception(f"Receipt {receipt[0]} of {key} failed")
+        elif isinstance(error, (Forbidden, BadRequest)) or record['attempts'] + 1 >= self.max_attempts:
+            record.update(status=DEAD, attempts=record['attempts'] + 1, error=str(error), done_at=now)
+            self.dead_lettered += 1
+            logger.error(f"Giving up on {record['method']} to {record['chat_id']} ({key}): {error}")
+        else:
+            record['attempts'] += 1
+            record.update(due=now + min(self.max_delay, self.base_delay * 2 ** (record['attempts'] - 1)), error=str(error))
+            self._schedule(key, record)
+            self.retried += 1
+            self._wakeup.set()
+        self._changed(key)
+
+    def _prune(self):
+        """Drop tombstones and dead letters past their retention"""
+        now = time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        expired = [
+            key for key, record in self.entries.items()
+            if record['status'] == SENT and record['done_at'] < now - self.keep_sent
+            or record['status'] == DEAD and record['done_at'] < now - self.keep_dead
+        ]
+        for key in expired:
+            del self.entries[key]
+            self._changed(key)
+
+    async def _run(self):
+        """Persist, then send what is due, whenever entries are queued or come due"""
+        while True:
+            timeout = self.prune_interval
+            next_due = self._next_due() if self.bot is not None else None
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._prune()
+            next_due = self._next_due()
+            if self.bot is None or next_due is None or next_due > time.time():
+                continue
+            if not await self.flush():
+                # Nothing is sent before it is durable; the flusher keeps retrying
+                await asyncio.sleep(1.0)
+                self._wakeup.set()
+                continue
+            self._send_due()
+
+    def start(self, bot=None):
+        """Start the background worker on the running loop"""
+        if bot is not None:
+            self.bot = bot
+            self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        """Send what is due for up to `timeout` seconds, then stop the worker
+
+        Entries still pending stay persisted and are sent after the next start.
+        """
+        deadline = time.monotonic() + timeout
+        while self._task is not None and self.bot is not None and time.monotonic() < deadline:
+            next_due = self._next_due()
+            if not self._in_flight and (next_due is None or next_due > time.time()):
+                break
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        """Return entry counts and delivery counters"""
+        return {
+            **self.counts(),
+            'in_flight': len(self._in_flight),
+            'delivered': self.sent,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+        }
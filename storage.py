@@ -0,0 +1,571 @@
+import asyncio
+import json
+import logging
+import marshal
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def encode_record(collection, key, value):
+    """Encode one mutation as a compact journal line"""
+    if value is None:
+        record = ['d', collection, key]
+    else:
+        record = ['p', collection, key, value]
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+
+class Storage:
+    """Interface of the state persistence backends
+
+    State is a set of collections (`tournaments`, `teams`, ...) mapping string
+    keys to JSON-serializable records. `load` returns all of them; the bot
+    keeps the whole state in memory. All I/O of the async methods runs on a
+    single worker thread so the event loop stays free and writes keep their
+    order. Creating a store does no I/O; the backend is opened by `load` or
+    `open`.
+    """
+
+    is_new = True
+    files = ()  # files holding the state, fingerprinted by WarmSnapshot
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+
+    def open(self):
+        """Prepare the backend for reads and writes; does nothing if it is open"""
+        raise NotImplementedError
+
+    def load(self):
+        """Open the backend and return the working set as {collection: {key: value}}"""
+        raise NotImplementedError
+
+    def import_state(self, state):
+        """Replace all stored state with `state`"""
+        raise NotImplementedError
+
+    def _encode(self, collection, key, value):
+        """Serialize one mutation on the event loop, before handlers touch it again"""
+        raise NotImplementedError
+
+    def _write(self, rows):
+        """Apply encoded mutations durably on the worker thread"""
+        raise NotImplementedError
+
+    def _size(self, row):
+        """Return the number of bytes one encoded mutation writes"""
+        raise NotImplementedError
+
+    async def _run(self, func, *args):
+        """Run a blocking storage call on the worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def open_in_background(self):
+        """Queue `open` on the worker thread, ahead of any later read or write"""
+        def report(future):
+            if future.exception() is not None:
+                logger.error(f"Error opening storage: {future.exception()}")
+        self._executor.submit(self.open).add_done_callback(report)
+
+    async def write(self, collection, key, value):
+        """Persist the new value of one record (None deletes it)"""
+        await self.write_many([(collection, key, value)])
+
+    async def write_many(self, mutations):
+        """Persist several record mutations in one durable write; returns the bytes written"""
+        rows = [self._encode(collection, key, value) for collection, key, value in mutations]
+        await self._run(self._write, rows)
+        return sum(self._size(row) for row in rows)
+
+    def close(self):
+        """Flush and release the backend"""
+        self._executor.shutdown(wait=True)
+
+
+class JournalStore(Storage):
+    """State persisted as a snapshot plus an append-only journal of mutations
+
+    Every mutation appends one compact line to the journal, so the cost of a
+    write depends on the size of the changed record only. Once the journal
+    grows past `compact_every` records it is folded into a new snapshot that
+    replaces the old one atomically (temp file + rename). The whole state is
+    the working set.
+    """
+
+    def __init__(self, snapshot_file, journal_file, compact_every=500):
+        super().__init__()
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.files = (snapshot_file, journal_file)
+        self.is_new = True
+        self._entries = {}  # collection -> {key: encoded value}, owned by the worker thread
+        self._journal = None
+        self._journal_records = 0
+
+    def open(self):
+        """Replay snapshot and journal into the encoded entries"""
+        if self._journal is not None:
+            return
+        self._entries = {}
+        self.is_new = not (os.path.exists(self.snapshot_file) or os.path.exists(self.journal_file))
+        self._replay(self.snapshot_file)
+        self._journal_records = self._replay(self.journal_file, truncate_tail=True)
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+
+    def load(self):
+        """Replay snapshot and journal into {collection: {key: value}}"""
+        self.open()
+        return {
+            collection: {key: json.loads(value) for key, value in entries.items()}
+            for collection, entries in self._entries.items()
+        }
+
+    def _replay(self, filename, truncate_tail=False):
+        """Apply the records of one file to the in-memory entries"""
+        try:
+            with open(filename, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return 0
+
+        applied = 0
+        offset = 0
+        for line in raw.splitlines(keepends=True):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError("incomplete record")
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring damaged tail of {filename} at byte {offset}")
+                if truncate_tail:
+                    with open(filename, 'r+b') as f:
+                        f.truncate(offset)
+                break
+            self._apply(record)
+            applied += 1
+            offset += len(line)
+        return applied
+
+    def _apply(self, record):
+        """Apply one decoded record to the in-memory entries"""
+        entries = self._entries.setdefault(record[1], {})
+        if record[0] == 'p':
+            entries[record[2]] = json.dumps(record[3], separators=(',', ':'), ensure_ascii=False)
+        else:
+            entries.pop(record[2], None)
+
+    def _encode(self, collection, key, value):
+        """Encode one mutation as a journal line"""
+        return encode_record(collection, key, value)
+
+    def _size(self, line):
+        """Return the size of a journal line in UTF-8"""
+        return len(line.encode())
+
+    def _write(self, lines):
+        """Write journal lines durably, compacting when the journal is long"""
+        self._journal.write(''.join(lines))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        for line in lines:
+            self._apply(json.loads(line))
+        self._journal_records += len(lines)
+        if self._journal_records >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        """Fold the journal into a fresh snapshot"""
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for collection, entries in self._entries.items():
+                for key, value in entries.items():
+                    f.write(f'["p",{json.dumps(collection)},{json.dumps(key, ensure_ascii=False)},{value}]\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+        self._fsync_dir(self.snapshot_file)
+
+        # Replaying the old journal over the new snapshot is harmless, so a
+        # crash before this point loses nothing
+        self._journal.close()
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._journal_records = 0
+        logger.info(f"Compacted journal into {self.snapshot_file}")
+
+    @staticmethod
+    def _fsync_dir(filename):
+        """Make a rename durable on filesystems that need it"""
+        try:
+            fd = os.open(os.path.dirname(filename) or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def import_state(self, state):
+        """Replace all state with `state` and write it as the snapshot"""
+        self._entries = {}
+        for collection, records in state.items():
+            for key, value in records.items():
+                self._apply(['p', collection, key, value])
+        self._compact()
+
+    def close(self):
+        """Compact pending journal records and stop the worker thread"""
+        self._executor.submit(self._close).result()
+        super().close()
+
+    def _close(self):
+        """Fold the journal into the snapshot and close it, if it was opened"""
+        if self._journal is not None:
+            self._compact()
+            self._journal.close()
+            self._journal = None
+
+
+class SQLiteStore(Storage):
+    """State persisted in SQLite, one row per record
+
+    Tournaments and teams live in their own tables, other collections share
+    a generic key/value table. The database runs in WAL mode so a write never
+    blocks readers. Finished tournaments are moved out to the archive by the
+    bot and everything stored is loaded into the working set, so no query
+    filters rows. Older databases pulled status, tournament id and team name
+    out of the JSON body into indexed columns; `open` drops those.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tournaments (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS teams (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS records (
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (collection, key)
+        );
+    """
+    LEGACY_INDEXES = ('idx_tournaments_status', 'idx_teams_tournament', 'idx_teams_name')
+    LEGACY_COLUMNS = {'tournaments': ('status',), 'teams': ('tournament_id', 'name_key', 'status')}
+
+    def __init__(self, db_file):
+        super().__init__()
+        self.db_file = db_file
+        self.files = (db_file, f"{db_file}-wal")
+        self._db = None
+
+    def open(self):
+        """Connect in WAL mode and create missing tables"""
+        if self._db is not None:
+            return
+        self.is_new = not os.path.exists(self.db_file)
+        self._db = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(self.SCHEMA)
+        self._drop_legacy_columns()
+
+    def _drop_legacy_columns(self):
+        """Drop the indexed columns of older databases, which nothing reads"""
+        statements = [
+            f"DROP INDEX {name}"
+            for (name,) in self._db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            if name in self.LEGACY_INDEXES
+        ]
+        # Older SQLite cannot drop columns; they are nullable and stay empty
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            for table, columns in self.LEGACY_COLUMNS.items():
+                existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+                statements += [f"ALTER TABLE {table} DROP COLUMN {column}" for column in columns if column in existing]
+        if statements:
+            with self._transaction() as db:
+                for statement in statements:
+                    db.execute(statement)
+            logger.info("Dropped the indexed columns of an older database")
+
+    def load(self):
+        """Load tournaments, teams and all other collections in the order they were first written"""
+        self.open()
+        state = {'tournaments': {}, 'teams': {}}
+        for (data,) in self._db.execute("SELECT data FROM tournaments ORDER BY rowid"):
+            tournament = json.loads(data)
+            state['tournaments'][tournament['id']] = tournament
+        for (data,) in self._db.execute("SELECT data FROM teams ORDER BY rowid"):
+            team = json.loads(data)
+            state['teams'][team['id']] = team
+        for collection, key, data in self._db.execute("SELECT collection, key, data FROM records ORDER BY rowid"):
+            state.setdefault(collection, {})[key] = json.loads(data)
+        return state
+
+    def import_state(self, state):
+        """Replace all rows with `state` in one transaction"""
+        with self._transaction() as db:
+            db.execute("DELETE FROM tournaments")
+            db.execute("DELETE FROM teams")
+            db.execute("DELETE FROM records")
+            for collection, records in state.items():
+                for key, value in records.items():
+                    self._put(db, self._encode(collection, key, value))
+
+    def _transaction(self):
+        """Return a context manager wrapping one write transaction"""
+        db = self._db
+
+        class Transaction:
+            def __enter__(self):
+                db.execute('BEGIN IMMEDIATE')
+                return db
+
+            def __exit__(self, exc_type, exc, tb):
+                db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+        return Transaction()
+
+    def _encode(self, collection, key, value):
+        """Build the row for one mutation; None rows are deletions"""
+        if value is None:
+            return collection, key, None
+        data = json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+        if collection in ('tournaments', 'teams'):
+            return collection, key, (key, data)
+        return collection, key, (collection, key, data)
+
+    def _size(self, row):
+        """Return the size of the JSON payload of a row; deletions count as 0"""
+        return len(row[2][-1].encode()) if row[2] is not None else 0
+
+    @staticmethod
+    def _put(db, encoded):
+        """Insert or update one encoded record
+
+        An update keeps the rowid of the row, so rows load in the order they
+        were first written, as the journal and the warm snapshot return them.
+        INSERT OR REPLACE would move every updated record to the end.
+        """
+        collection, key, row = encoded
+        if collection in ('tournaments', 'teams'):
+            db.execute(
+                f"INSERT INTO {collection} (id, data) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+                row
+            )
+        else:
+            db.execute(
+                "INSERT INTO records (collection, key, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (collection, key) DO UPDATE SET data = excluded.data",
+                row
+            )
+
+    @staticmethod
+    def _delete(db, collection, key):
+        """Delete one record"""
+        if collection in ('tournaments', 'teams'):
+            db.execute(f"DELETE FROM {collection} WHERE id = ?", (key,))
+        else:
+            db.execute("DELETE FROM records WHERE collection = ? AND key = ?", (collection, key))
+
+    def _write(self, rows):
+        """Apply all mutations in a single transaction"""
+        with self._transaction() as db:
+            for collection, key, row in rows:
+                if row is None:
+                    self._delete(db, collection, key)
+                else:
+                    self._put(db, (collection, key, row))
+
+    def close(self):
+        """Checkpoint the WAL and close the database"""
+        super().close()
+        if self._db is not None:
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.close()
+            self._db = None
+
+
+class WarmSnapshot:
+    """Binary copy of the working set that makes cold starts cheap
+
+    Written with marshal after a clean shutdown, together with the size and
+    modification time of every backend file. On startup it is only used if
+    those files are unchanged, so any write since then, a crash with a
+    non-empty WAL or a different Python version falls back to loading the
+    backend. It is a cache: deleting it is always safe.
+    """
+
+    MAGIC = b'BTWS1'
+
+    def __init__(self, path, files):
+        self.path = path
+        self.files = files
+
+    def _fingerprint(self):
+        """Return (path, size, mtime) of every backend file, or None for a missing one"""
+        fingerprint = []
+        for path in self.files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                fingerprint.append((path, None, None))
+            else:
+                fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+
+    def load(self):
+        """Return the saved state if it still matches the backend files, else None"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if not raw.startswith(self.MAGIC):
+            return None
+        try:
+            python, fingerprint, state = marshal.loads(raw[len(self.MAGIC):])
+        except (EOFError, ValueError, TypeError):
+            logger.warning(f"Ignoring damaged snapshot {self.path}")
+            return None
+        if python != tuple(sys.version_info[:2]) or fingerprint != self._fingerprint():
+            return None
+        return state
+
+    def save(self, state):
+        """Write state for the backend files as they are now; returns False if it cannot be encoded"""
+        try:
+            # Version 2 has no object references, so shared lists never come back aliased
+            payload = marshal.dumps((tuple(sys.version_info[:2]), self._fingerprint(), state), 2)
+        except ValueError as e:
+            logger.error(f"Cannot write snapshot {self.path}: {e}")
+            return False
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(self.MAGIC + payload)
+        os.replace(tmp_file, self.path)
+        return True
+
+    def discard(self):
+        """Delete the snapshot"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class WriteBehind:
+    """Coalesce record mutations and persist them in batches
+
+    Handlers only mark records dirty. A background task waits `window`
+    seconds after the first mark, then writes the current value of every
+    dirty record in one `write_many` call, so any number of mutations to the
+    same records inside a window cost a single durable write.
+    """
+
+    def __init__(self, store, collections, window=0.2, on_flush=None):
+        self.store = store
+        self.collections = collections  # collection name -> live dict
+        self.window = window
+        self.on_flush = on_flush  # called with (latency, bytes) after every successful write
+        self._dirty = {}  # (collection, key) -> None, in marking order
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.mutations = 0
+        self.records_written = 0
+        self.bytes_written = 0
+        self.flush_count = 0
+        self.flush_failures = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def mark_dirty(self, collection, key):
+        """Schedule the current value of one record for persistence"""
+        self._dirty[(collection, key)] = None
+        self.mutations += 1
+        self._wakeup.set()
+
+    async def flush(self):
+        """Write all dirty records now; returns False if the write failed"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return True
+            dirty, self._dirty = self._dirty, {}
+            mutations = [
+                (collection, key, self.collections[collection].get(key))
+                for collection, key in dirty
+            ]
+            started = time.perf_counter()
+            try:
+                size = await self.store.write_many(mutations)
+            except Exception as e:
+                logger.error(f"Error saving data: {e}")
+                self.flush_failures += 1
+                # Keep the records dirty so the next flush retries them
+                self._dirty = {**dirty, **self._dirty}
+                self._wakeup.set()
+                return False
+            latency = time.perf_counter() - started
+            self.flush_count += 1
+            self.records_written += len(mutations)
+            self.bytes_written += size
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            if self.on_flush is not None:
+                self.on_flush(latency, size)
+            return True
+
+    async def _run(self):
+        """Flush dirty records at most once per window"""
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            if not await self.flush():
+                # Back off instead of spinning on a failing backend
+                await asyncio.sleep(max(self.window, 1.0))
+
+    def start(self):
+        """Start the background flusher on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher and write everything still dirty"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        """Return flush counters and latencies"""
+        return {
+            'flush_count': self.flush_count,
+            'flush_failures': self.flush_failures,
+            'mutations': self.mutations,
+            'records_written': self.records_written,
+            'bytes_written': self.bytes_written,
+            'pending_records': len(self._dirty),
+            'coalescing_ratio': self.mutations / self.records_written if self.records_written else 0.0,
+            'last_flush_latency': self.last_flush_latency,
+            'avg_flush_latency': self.total_flush_latency / self.flush_count if self.flush_count else 0.0,
+            'max_flush_latency': self.max_flush_latency,
+        }
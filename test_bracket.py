@@ -0,0 +1,82 @@
+"""Single-elimination engine: bye placement, pass-through winners and round counters"""
+import random
+
+import pytest
+
+from bracket import BYE, BracketError, create_bracket, get_match, report_winner, round_matches, round_nodes
+
+SIZES = range(2, 140)
+
+
+def is_empty(bracket, node):
+    """Return True if no team was seeded below a node"""
+    if node >= bracket['size']:
+        return bracket['slots'][node] == BYE
+    return is_empty(bracket, 2 * node) and is_empty(bracket, 2 * node + 1)
+
+
+def undecided_matches(bracket, round_number):
+    """Count the nodes of a round that are real matches without a winner"""
+    return sum(
+        1 for node in round_nodes(bracket, round_number)
+        if not is_empty(bracket, 2 * node) and not is_empty(bracket, 2 * node + 1) and bracket['slots'][node] is None
+    )
+
+
+def assert_counters(bracket):
+    for round_number in range(1, bracket['rounds'] + 1):
+        assert bracket['pending'][round_number] == undecided_matches(bracket, round_number)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_byes_are_spread_and_never_paired(n):
+    bracket = create_bracket([f"t{i}" for i in range(n)])
+    size = bracket['size']
+    leaves = bracket['slots'][size:]
+    assert leaves.count(BYE) == size - n
+    assert all(leaves[k] != BYE or leaves[k + 1] != BYE for k in range(0, size, 2))
+    half = size // 2
+    assert abs(leaves[:half].count(BYE) - leaves[half:].count(BYE)) <= 1
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_bye_winners_pass_through(n):
+    team_ids = [f"t{i}" for i in range(n)]
+    bracket = create_bracket(team_ids)
+    byes = [match for match in round_matches(bracket, 1) if match['team2'] is None]
+    assert len(byes) == bracket['size'] - n
+    for match in byes:
+        assert match['winner'] == match['team1']
+        assert get_match(bracket, match['id']) is None
+    seeded = [team for match in round_matches(bracket, 1) for team in (match['team1'], match['team2']) if team]
+    assert sorted(seeded) == sorted(team_ids)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_playthrough_keeps_pending_counters(n):
+    rng = random.Random(n)
+    bracket = create_bracket([f"t{i}" for i in range(n)])
+    assert_counters(bracket)
+    reported = 0
+    while bracket['status'] != 'finished':
+        round_number = bracket['current_round']
+        open_matches = [m for m in round_matches(bracket, round_number) if m['team2'] and not m['winner']]
+        assert open_matches
+        for index, match in enumerate(open_matches):
+            completed = report_winner(bracket, match['id'], rng.choice((1, 2)))
+            reported += 1
+            assert completed == (round_number if index == len(open_matches) - 1 else None)
+            assert_counters(bracket)
+    assert reported == n - 1
+    assert bracket['winner'] == bracket['slots'][1]
+    assert bracket['version'] == n - 1
+
+
+def test_a_result_is_reported_once():
+    bracket = create_bracket(['a', 'b', 'c', 'd'])
+    match_id = round_matches(bracket, 1)[0]['id']
+    report_winner(bracket, match_id, 1)
+    with pytest.raises(BracketError):
+        report_winner(bracket, match_id, 2)
+    with pytest.raises(BracketError):
+        report_winner(bracket, 1, 1)  # the final is not ready yet
@@ -0,0 +1,40 @@
+"""Callback data codec: round trips, ids with separators and rejected payloads"""
+import pytest
+
+import callbacks
+from callbacks import MAX_CALLBACK_BYTES, CallbackError, decode, encode
+
+IDS = ['tr014hio8jy', 'tournament_20240101120000', 'a:b:c', 'team_1:2_3', ':', '_', 'é']
+
+
+def sample_arguments(types, string_id):
+    return {argument: (string_id if kind is str else 36 ** 3 + 7) for argument, kind in types}
+
+
+@pytest.mark.parametrize('string_id', IDS)
+@pytest.mark.parametrize('name', sorted(name for name, _ in callbacks._operations.values()))
+def test_round_trip(name, string_id):
+    types = callbacks._operations[callbacks._opcodes[name]][1]
+    arguments = sample_arguments(types, string_id)
+    assert decode(encode(name, **arguments)) == (name, arguments)
+
+
+@pytest.mark.parametrize('value', [0, 1, 35, 36, 46655, 2 ** 40])
+def test_integers_round_trip(value):
+    data = encode('report_winner', match_id=value, slot=2, page=0, tournament_id='t')
+    assert decode(data)[1]['match_id'] == value
+
+
+def test_payload_is_within_telegram_limit():
+    with pytest.raises(CallbackError):
+        encode('team_details', team_id='x' * MAX_CALLBACK_BYTES)
+    with pytest.raises(CallbackError):
+        encode('report_winner', match_id=-1, slot=1, page=0, tournament_id='t')
+
+
+@pytest.mark.parametrize('data', [
+    '', '1', '2w:1:1:0:t', '1?', 'report_winner_tournament_1_1_1', '1w:1:1:t', '1w:zz!:1:0:t', '1mx',
+])
+def test_invalid_payloads_are_rejected(data):
+    with pytest.raises(CallbackError):
+        decode(data)
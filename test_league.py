@@ -0,0 +1,86 @@
+"""Round-robin and Swiss engines: schedule completeness, rematches, byes and round counters"""
+import random
+from collections import Counter
+
+import pytest
+
+from bracket import BracketError
+from league import ROUND_STRIDE, circle_pairs, create_round_robin, create_swiss, get_match, report_winner, round_matches
+
+SIZES = range(2, 140)
+
+
+def play(league, rng):
+    """Report random results until the league finishes; return the pairs and byes of every round"""
+    rounds = []
+    while league['status'] != 'finished':
+        round_number = league['current_round']
+        matches = round_matches(league, round_number)
+        rounds.append(matches)
+        teams_this_round = [team for match in matches for team in (match['team1'], match['team2']) if team]
+        assert len(teams_this_round) == len(set(teams_this_round)) == len(league['teams'])
+        open_matches = [match for match in matches if match['team2']]
+        assert league['pending'] == len(open_matches)
+        for index, match in enumerate(open_matches):
+            completed = report_winner(league, match['id'], rng.choice((1, 2)))
+            assert completed == (round_number if index == len(open_matches) - 1 else None)
+            if completed is None:
+                assert league['pending'] == len(open_matches) - index - 1
+    return rounds
+
+
+def pair_counts(rounds):
+    return Counter(frozenset((m['team1'], m['team2'])) for matches in rounds for m in matches if m['team2'])
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_circle_method_pairs_everyone_once(n):
+    team_ids = [f"t{i}" for i in range(n)]
+    round_count = n - 1 + n % 2
+    pairs = Counter()
+    byes = Counter()
+    for round_index in range(round_count):
+        round_pairs = list(circle_pairs(team_ids, round_index))
+        assert len(round_pairs) == (n + 1) // 2
+        for team1, team2 in round_pairs:
+            if team2 is None:
+                byes[team1] += 1
+            else:
+                pairs[frozenset((team1, team2))] += 1
+    assert len(pairs) == n * (n - 1) // 2
+    assert set(pairs.values()) == {1}
+    assert byes == (Counter(team_ids) if n % 2 else Counter())
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_round_robin_plays_the_whole_schedule(n):
+    league = create_round_robin([f"t{i}" for i in range(n)])
+    rounds = play(league, random.Random(n))
+    assert len(rounds) == n - 1 + n % 2
+    counts = pair_counts(rounds)
+    assert len(counts) == n * (n - 1) // 2 and set(counts.values()) == {1}
+    assert sum(wins for wins, _ in league['standings'].values()) == n * (n - 1) // 2
+    assert league['winner'] in league['teams']
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_swiss_avoids_rematches_and_repeated_byes(n):
+    league = create_swiss([f"t{i}" for i in range(n)])
+    rounds = play(league, random.Random(n))
+    assert len(rounds) == league['rounds']
+    assert set(pair_counts(rounds).values()) <= {1}
+    byes = Counter(m['team1'] for matches in rounds for m in matches if not m['team2'])
+    assert set(byes.values()) <= {1}
+    assert sorted(byes.elements()) == sorted(league['byes'])
+
+
+def test_old_round_ids_are_rejected():
+    league = create_swiss(['a', 'b', 'c', 'd'])
+    first_round = [m['id'] for m in round_matches(league, 1)]
+    for match_id in first_round:
+        report_winner(league, match_id, 1)
+    assert league['current_round'] == 2
+    assert get_match(league, first_round[0]) is None
+    with pytest.raises(BracketError):
+        report_winner(league, first_round[0], 1)
+    assert round_matches(league, 2)[0]['id'] // ROUND_STRIDE == 2
@@ -0,0 +1,80 @@
+"""Round messages must fit in one Telegram message at any bracket size"""
+import pytest
+
+import main
+from bracket import create_bracket
+from league import create_round_robin, create_swiss
+
+CREATE = {'single_elimination': create_bracket, 'round_robin': create_round_robin, 'swiss': create_swiss}
+SIZES = [256, 1024]
+
+
+@pytest.fixture
+def start(monkeypatch):
+    """Return a function starting a tournament of `size` teams and returning its bracket"""
+    monkeypatch.setattr(main, 'teams', {})
+    monkeypatch.setattr(main, 'tournaments', {})
+
+    def build(tournament_format, size, name_length=15):
+        team_ids = [f"team{number}" for number in range(size)]
+        for number, team_id in enumerate(team_ids):
+            main.teams[team_id] = {'id': team_id, 'name': f"{number:0{name_length}d}"}
+        main.tournaments['t1'] = {'id': 't1', 'name': "Spring Cup", 'bracket': CREATE[tournament_format](team_ids)}
+        return main.tournaments['t1']['bracket']
+
+    return build
+
+
+def open_matches(bracket):
+    """Return the matches of the current round without a winner"""
+    round_matches = main.engine(bracket).round_matches(bracket, bracket['current_round'])
+    return [match for match in round_matches if match['team2'] and not match['winner']]
+
+
+def decide(bracket, count):
+    """Report the first team as winner of `count` open matches of the current round"""
+    for match in open_matches(bracket)[:count]:
+        main.engine(bracket).report_winner(bracket, match['id'], 1)
+
+
+def assert_fits(round_number, page=0):
+    text = main.round_message_text(main.tournaments['t1'], round_number, page)
+    assert main.message_length(text) <= main.MESSAGE_LIMIT
+    return text
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('tournament_format', sorted(CREATE))
+def test_open_round_shows_one_page(start, tournament_format, size):
+    bracket = start(tournament_format, size)
+    pending = len(open_matches(bracket))
+    pages = -(-pending // main.ROUND_PAGE_SIZE)
+    for page in (0, pages - 1):
+        text = assert_fits(bracket['current_round'], page)
+        assert f"Page {page + 1}/{pages} · {pending} matches open" in text
+        assert text.count("⚔️") == len(main.round_page(bracket, bracket['current_round'], page)[0])
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('tournament_format', sorted(CREATE))
+def test_results_that_do_not_fit_are_counted(start, tournament_format, size):
+    bracket = start(tournament_format, size)
+    decide(bracket, len(open_matches(bracket)) - 1)
+    text = assert_fits(bracket['current_round'])
+    assert "more results" in text
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('tournament_format', sorted(CREATE))
+def test_complete_round_fits(start, tournament_format, size):
+    bracket = start(tournament_format, size)
+    round_number = bracket['current_round']
+    decide(bracket, len(open_matches(bracket)))
+    assert bracket['current_round'] == round_number + 1
+    assert "Round complete!" in assert_fits(round_number)
+
+
+def test_long_names_are_cut(start):
+    bracket = start('single_elimination', 16, name_length=1000)
+    text = assert_fits(bracket['current_round'])
+    assert text.endswith("…")
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+ALL_TOURNAMENTS = None  # scope of views that list several tournaments
+
+
+class ViewCache:
+    """Rendered menus keyed by (view, tournament id, page), tagged with versions
+
+    Every tournament has a version that mutations bump through `bump`; views
+    that list several tournaments use the ALL_TOURNAMENTS scope, which is
+    bumped together with any tournament. Versions come from one counter, so
+    a bumped version is never reused. An entry remembers the version of its
+    scope when it was built and is only served while that version is
+    current, so a stale render is never shown and a mutation does not have
+    to find the entries it affects. At most `max_entries` renders are kept;
+    the least recently used go first.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (view, tournament id, page) -> (version, value)
+        self.versions = {}  # tournament id or ALL_TOURNAMENTS -> version
+        self._clock = 0
+        self.hits = {}  # view -> lookups served from the cache
+        self.misses = {}  # view -> lookups that had to render
+
+    def get(self, view, tournament_id=ALL_TOURNAMENTS, page=0):
+        """Return the cached render of a view, or None if it is missing or stale"""
+        key = (view, tournament_id, page)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == self.versions.get(tournament_id, 0):
+            self.entries.move_to_end(key)
+            self.hits[view] = self.hits.get(view, 0) + 1
+            return entry[1]
+        if entry is not None:
+            del self.entries[key]
+        self.misses[view] = self.misses.get(view, 0) + 1
+        return None
+
+    def put(self, view, tournament_id, page, value):
+        """Store the render of a view built from the current version"""
+        key = (view, tournament_id, page)
+        self.entries[key] = (self.versions.get(tournament_id, 0), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def bump(self, tournament_id=ALL_TOURNAMENTS):
+        """Invalidate the views of one tournament, if given, and those listing tournaments"""
+        self._clock += 1
+        self.versions[tournament_id] = self._clock
+        self.versions[ALL_TOURNAMENTS] = self._clock
+
+    def forget(self, tournament_id):
+        """Drop the version and the renders of a deleted tournament"""
+        self.versions.pop(tournament_id, None)
+        for key in [key for key in self.entries if key[1] == tournament_id]:
+            del self.entries[key]
+        self.bump()
+
+    def hit_rates(self):
+        """Return {view: fraction of lookups served from the cache}"""
+        return {
+            view: self.hits.get(view, 0) / (self.hits.get(view, 0) + self.misses.get(view, 0))
+            for view in set(self.hits) | set(self.misses)
+        }